@@ -0,0 +1,68 @@
+"""Load test for the cross-request OCR batching scheduler.
+
+Simulates concurrent clients, each OCR'ing bundled screenshots through an
+OCRBatcher, and reports throughput and latency for every combination of
+maximum batch size and maximum wait. Run from the repository root:
+
+    python benchmarks/batching_load.py --clients 8 --requests 4 --batch-sizes 1 4 8 --waits 0 10 50
+"""
+import argparse
+import glob
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import cv2
+
+from ocr_batcher import OCRBatcher
+
+
+def run(batcher: OCRBatcher, images: list, clients: int, requests: int) -> tuple[float, list[float]]:
+    def client(i: int) -> list[float]:
+        latencies = []
+        for j in range(requests):
+            img = images[(i * requests + j) % len(images)]
+            start = time.perf_counter()
+            batcher.submit_image(img).result()
+            latencies.append(time.perf_counter() - start)
+        return latencies
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(clients) as executor:
+        latencies = [lat for lats in executor.map(client, range(clients)) for lat in lats]
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default="images/*/*.png", help="Glob of screenshots to OCR")
+    parser.add_argument("--clients", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=4, help="Images OCR'd by each client")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--waits", type=float, nargs="+", default=[0, 10, 50], help="Maximum waits in ms")
+    parser.add_argument("--workers", type=int, default=1, help="Batcher worker threads")
+    args = parser.parse_args()
+
+    images = [cv2.imread(path) for path in sorted(glob.glob(args.images))]
+    print(f"{len(images)} images, {args.clients} clients x {args.requests} requests, {args.workers} worker(s)")
+    print(f"{'batch':>6} {'wait ms':>8} {'img/s':>7} {'p50 s':>7} {'p95 s':>7} {'avg batch':>10}")
+    for batch_size in args.batch_sizes:
+        for wait in args.waits:
+            batcher = OCRBatcher(max_batch_size=batch_size, max_wait_ms=wait, workers=args.workers)
+            batcher.submit_image(images[0]).result()  # warm up the worker's engine
+            batcher.batches = batcher.items = 0
+            elapsed, latencies = run(batcher, images, args.clients, args.requests)
+            latencies.sort()
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            print(
+                f"{batch_size:>6} {wait:>8g} {len(latencies) / elapsed:>7.2f} "
+                f"{statistics.median(latencies):>7.2f} {p95:>7.2f} {batcher.items / max(1, batcher.batches):>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
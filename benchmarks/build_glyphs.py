@@ -0,0 +1,108 @@
+"""Builds the glyph templates used to read numeric value cells without OCR.
+
+Finds the text cells of every bundled screenshot (see `layout.find_cells`),
+reads them with the OCR engine, and cuts each confidently read numeric cell
+into glyphs labelled by the OCR text. Every `--holdout`th screenshot is kept
+out of the templates, and the matcher built from the others is checked
+against OCR on the held-out numeric cells: how many it reads, how many it
+leaves to OCR, and how many it reads differently (which should be none). Run
+from the repository root:
+
+    python benchmarks/build_glyphs.py --write
+
+`--write` stores templates built from every screenshot in src/glyph_templates.npz.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import numpy as np
+
+from engines import resolve_engine
+from glyphs import GLYPH_MIN_SCORE, GLYPH_TEMPLATES, GLYPHS, GlyphMatcher, segment_glyphs
+from layout import crop_cell, find_cells
+from ocr import decode_image_bytes
+
+# Only cells OCR read this confidently label glyphs
+MIN_OCR_CONFIDENCE = 0.95
+
+
+def numeric_cells(paths: list[str], engine: str) -> list[tuple[np.ndarray, str]]:
+    """(tight crop, OCR text) of every cell of the screenshots at `paths` OCR read as a number."""
+    reader = resolve_engine(engine)
+    cells = []
+    for path in paths:
+        with open(path, "rb") as f:
+            img = decode_image_bytes(f.read())
+        boxes = [cell for row in find_cells(img) for cell in row]
+        texts = reader.recognize([crop_cell(img, cell) for cell in boxes])
+        for (left, top, right, bottom), (text, confidence) in zip(boxes, texts):
+            text = text.replace(" ", "")
+            if text and confidence >= MIN_OCR_CONFIDENCE and set(text) <= set(GLYPHS):
+                cells.append((img[top:bottom, left:right], text))
+    return cells
+
+
+def build(cells: list[tuple[np.ndarray, str]], per_glyph: int) -> GlyphMatcher:
+    samples: dict[str, list[tuple[np.ndarray, float]]] = {}
+    for crop, text in cells:
+        glyphs = segment_glyphs(crop)
+        if len(glyphs) != len(text):
+            continue  # touching or broken glyphs; the labels would not line up
+        for char, glyph in zip(text, glyphs):
+            samples.setdefault(char, []).append(glyph)
+    vectors, labels, aspects = [], [], []
+    for char, glyphs in sorted(samples.items()):
+        # Spread the kept samples over every page and font size they came from
+        for idx in np.linspace(0, len(glyphs) - 1, min(per_glyph, len(glyphs))).astype(int):
+            vectors.append(glyphs[idx][0])
+            labels.append(char)
+            aspects.append(glyphs[idx][1])
+    return GlyphMatcher(np.stack(vectors), np.array(labels), np.array(aspects, np.float32))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default="images/*/*.png")
+    parser.add_argument("--engine", default="rapidocr")
+    parser.add_argument("--per-glyph", type=int, default=12, help="templates kept per glyph")
+    parser.add_argument("--min-score", type=float, default=GLYPH_MIN_SCORE)
+    parser.add_argument("--holdout", type=int, default=4, help="check on every Nth screenshot, built from the rest")
+    parser.add_argument("--write", action="store_true", help=f"write the templates to {GLYPH_TEMPLATES}")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(args.images))
+    held_out = paths[args.holdout - 1::args.holdout]
+    train = numeric_cells([path for path in paths if path not in held_out], args.engine)
+    test = numeric_cells(held_out, args.engine)
+    matcher = build(train, args.per_glyph)
+    matcher.min_score = args.min_score
+    print(
+        f"{len(matcher.labels)} templates for {''.join(sorted(set(matcher.labels)))!r} from {len(train)} cells, "
+        f"checked on {len(test)} cells of {len(held_out)} held-out screenshots"
+    )
+
+    read = wrong = 0
+    start = time.perf_counter()
+    for crop, text in test:
+        result = matcher.read(crop)
+        if result is None:
+            continue
+        read += 1
+        if result[0] != text:
+            wrong += 1
+            print(f"  misread {text!r} as {result[0]!r} ({result[1]:.3f})")
+    elapsed = time.perf_counter() - start
+    print(f"read {read}/{len(test)} held-out numeric cells, {wrong} differ from OCR, {elapsed / max(1, len(test)) * 1e6:.0f}us per cell")
+
+    if args.write:
+        matcher = build(train + test, args.per_glyph)
+        np.savez_compressed(GLYPH_TEMPLATES, vectors=matcher.vectors, labels=matcher.labels, aspects=matcher.aspects)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""End-to-end benchmark of the parsers over the bundled screenshots.
+
+Runs `parse_bonus_overview` on images/minime and `parse_battle_report` on
+images/test_battle_report in-process, checks every result against the golden
+outputs in benchmarks/golden, and reports per-stage timings (decode, dedup, detect,
+classify, recognize, match_glyphs, stitch, merge_boxes, parse) with percentiles over the repeats.
+Run from the repository root:
+
+    python benchmarks/e2e.py --repeat 5 --output results.json
+    python benchmarks/e2e.py --baseline results.json --max-slowdown 0.2
+
+The OCR result cache is disabled so every repeat runs OCR. Exits with status 1
+when an output differs from its golden file or, with `--baseline`, when a
+suite's median time regressed by more than `--max-slowdown`. `--update-golden`
+rewrites the golden files from the current outputs instead of checking them.
+"""
+import argparse
+import base64
+import glob
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from battle_report import parse_battle_report
+from bonus_overview import parse_bonus_overview
+from ocr_cache import ocr_cache
+from schemas.outputs import BattleOutcome, BattleReportOutput, BonusOverviewOutput, Stats
+from timings import STAGES, collect_timings
+
+GOLDEN_DIR = os.path.join(os.path.dirname(__file__), "golden")
+
+
+def run_bonus_overview(images_b64: list[str], ocr_engine: str = "rapidocr") -> dict:
+    stats = parse_bonus_overview(images_b64, ocr_engine)
+    return BonusOverviewOutput.from_stats_dict(stats).model_dump()
+
+
+def run_battle_report(images_b64: list[str], ocr_engine: str = "rapidocr") -> dict:
+    stats, outcome = parse_battle_report(images_b64, ocr_engine, stats_only=False)
+    return BattleReportOutput(
+        left_stats=Stats.from_dict(stats["left"]),
+        right_stats=Stats.from_dict(stats["right"]),
+        troops_outcome=BattleOutcome.from_dict(outcome),
+    ).model_dump()
+
+
+SUITES = {
+    "bonus_overview": ("images/minime/*.png", run_bonus_overview),
+    "battle_report": ("images/test_battle_report/*.png", run_battle_report),
+}
+
+
+def load_b64(pattern: str) -> list[str]:
+    images = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, "rb") as f:
+            images.append(base64.b64encode(f.read()).decode())
+    return images
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    if len(samples) == 1:
+        return {"p50": samples[0], "p90": samples[0], "p99": samples[0], "mean": samples[0]}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {"p50": cuts[49], "p90": cuts[89], "p99": cuts[98], "mean": statistics.fmean(samples)}
+
+
+def run_suite(name: str, repeat: int, warmup: int, update_golden: bool, ocr_engine: str = "rapidocr") -> dict:
+    pattern, run = SUITES[name]
+    images_b64 = load_b64(pattern)
+    golden_path = os.path.join(GOLDEN_DIR, f"{name}.json")
+
+    for _ in range(warmup):
+        run(images_b64, ocr_engine)
+
+    totals, stages, output = [], {stage: [] for stage in STAGES}, None
+    for _ in range(repeat):
+        with collect_timings() as timings:
+            start = time.perf_counter()
+            output = run(images_b64, ocr_engine)
+            totals.append(time.perf_counter() - start)
+        recorded = timings.as_dict()
+        for stage in STAGES:
+            stages[stage].append(recorded.get(stage, 0.0))
+
+    if update_golden:
+        os.makedirs(GOLDEN_DIR, exist_ok=True)
+        with open(golden_path, "w") as f:
+            json.dump(output, f, indent=2)
+            f.write("\n")
+        matches_golden = True
+    else:
+        with open(golden_path) as f:
+            matches_golden = json.load(f) == output
+
+    return {
+        "images": len(images_b64),
+        "repeat": repeat,
+        "matches_golden": matches_golden,
+        "output": output,
+        "total_s": percentiles(totals),
+        "stages_s": {stage: percentiles(samples) for stage, samples in stages.items()},
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def regressions(results: dict, baseline_path: str, max_slowdown: float) -> list[str]:
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    found = []
+    for name, suite in results["suites"].items():
+        before = baseline.get("suites", {}).get(name)
+        if before is None:
+            continue
+        old, new = before["total_s"]["p50"], suite["total_s"]["p50"]
+        if new > old * (1 + max_slowdown):
+            found.append(f"{name}: median {old:.2f}s -> {new:.2f}s ({new / old - 1:+.0%})")
+    return found
+
+
+def print_suite(name: str, suite: dict) -> None:
+    status = "ok" if suite["matches_golden"] else "MISMATCH"
+    total = suite["total_s"]
+    print(f"{name}: {suite['images']} images x {suite['repeat']}  golden {status}")
+    print(f"  {'total':12} p50 {total['p50']:7.3f}s  p90 {total['p90']:7.3f}s  p99 {total['p99']:7.3f}s")
+    for stage, stats in suite["stages_s"].items():
+        print(f"  {stage:12} p50 {stats['p50']:7.3f}s  p90 {stats['p90']:7.3f}s  p99 {stats['p99']:7.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--suites", nargs="+", choices=list(SUITES), default=list(SUITES))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to compare median times with")
+    parser.add_argument("--max-slowdown", type=float, default=0.2)
+    parser.add_argument("--engine", default="rapidocr", help="OCR engine name, or fastest / most_accurate")
+    parser.add_argument("--update-golden", action="store_true")
+    args = parser.parse_args()
+
+    ocr_cache.max_bytes = 0
+    ocr_cache.directory = None
+
+    results = {
+        "revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "engine": args.engine,
+        "suites": {},
+    }
+    for name in args.suites:
+        results["suites"][name] = run_suite(name, max(1, args.repeat), args.warmup, args.update_golden, args.engine)
+        print_suite(name, results["suites"][name])
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    failed = [name for name, suite in results["suites"].items() if not suite["matches_golden"]]
+    if args.baseline:
+        slower = regressions(results, args.baseline, args.max_slowdown)
+        for line in slower:
+            print(f"regression: {line}")
+        failed += slower
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Measures the latency/accuracy profile of every installed OCR engine.
+
+For each engine, OCRs the pages the parsers actually read (both bonus overview
+screenshots, and the battle report stats and overview pages) to get seconds
+per page, then runs both parsers end to end and counts how many of the golden
+values in benchmarks/golden they reproduce. Run from the repository root:
+
+    python benchmarks/engine_profiles.py --write
+
+`--write` stores the profiles in src/engine_profiles.json, where the engine
+registry reads them to resolve "fastest" and "most_accurate". Engines missing
+from that file are never picked by those aliases.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from e2e import GOLDEN_DIR, SUITES, load_b64
+from engines import ENGINES, OCR_ENGINE_PROFILES
+from ocr import decode_image_bytes, ocr_image
+from ocr_cache import ocr_cache
+
+TIMED_PAGES = ["images/minime/1.png", "images/minime/2.png", "images/test_battle_report/01.png", "images/test_battle_report/03.png"]
+
+
+def flatten(value) -> list:
+    if isinstance(value, dict):
+        return [v for key in sorted(value) for v in flatten(value[key])]
+    if isinstance(value, list):
+        return [v for item in value for v in flatten(item)]
+    return [value]
+
+
+def profile(engine: str, repeat: int) -> dict[str, float]:
+    pages = []
+    for path in TIMED_PAGES:
+        with open(path, "rb") as f:
+            pages.append(decode_image_bytes(f.read()))
+    ocr_image(pages[0], engine)  # load the model
+    latencies = []
+    for _ in range(repeat):
+        for page in pages:
+            start = time.perf_counter()
+            ocr_image(page, engine)
+            latencies.append(time.perf_counter() - start)
+
+    matching = total = 0
+    for name, (pattern, run) in SUITES.items():
+        with open(os.path.join(GOLDEN_DIR, f"{name}.json")) as f:
+            golden = flatten(json.load(f))
+        try:
+            output = flatten(run(load_b64(pattern), engine))
+        except ValueError:
+            output = []
+        total += len(golden)
+        matching += sum(a == b for a, b in zip(golden, output))
+
+    return {"seconds_per_page": round(statistics.median(latencies), 3), "accuracy": round(matching / total, 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engines", nargs="+", help="engines to profile (default: every installed one)")
+    parser.add_argument("--repeat", type=int, default=2)
+    parser.add_argument("--write", action="store_true", help=f"merge the results into {OCR_ENGINE_PROFILES}")
+    args = parser.parse_args()
+
+    ocr_cache.max_bytes = 0
+    ocr_cache.directory = None
+
+    names = args.engines or [name for name, engine in ENGINES.items() if engine.available()]
+    profiles = {}
+    for name in names:
+        profiles[name] = profile(name, args.repeat)
+        print(f"{name:15} {profiles[name]['seconds_per_page']:6.3f}s/page  accuracy {profiles[name]['accuracy']:.1%}")
+
+    if args.write:
+        try:
+            with open(OCR_ENGINE_PROFILES) as f:
+                stored = json.load(f)
+        except OSError:
+            stored = {}
+        stored.update(profiles)
+        with open(OCR_ENGINE_PROFILES, "w") as f:
+            json.dump(stored, f, indent=2, sort_keys=True)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
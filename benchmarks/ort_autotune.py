@@ -0,0 +1,91 @@
+"""Finds the ONNX Runtime thread layout with the best OCR throughput on this machine.
+
+Tries every split of the CPUs into OCR workers (`OCR_POOL_SIZE`) times intra-op
+threads per session, with thread spinning on and off. Each layout OCRs the
+bundled screenshots with one engine per worker, all workers busy at once, and
+reports pages per second. Run from the repository root:
+
+    python benchmarks/ort_autotune.py --write ort_settings.json
+
+`--write` stores the best layout's session settings for `ORT_SETTINGS_FILE`;
+the matching `OCR_POOL_SIZE` is printed.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import cv2
+
+from ort_settings import DEFAULT_SETTINGS, MODELS, new_rapidocr
+
+
+def layouts(cpus: int) -> list[tuple[int, int, bool]]:
+    """(workers, intra-op threads, allow spinning) candidates that use every CPU once."""
+    candidates = []
+    workers = 1
+    while workers <= cpus:
+        for spinning in (True, False):
+            candidates.append((workers, max(1, cpus // workers), spinning))
+        workers *= 2
+    if cpus & (cpus - 1):
+        # Not a power of two: also one single-threaded worker per CPU
+        candidates += [(cpus, 1, True), (cpus, 1, False)]
+    return candidates
+
+
+def throughput(pages: list, workers: int, intra: int, spinning: bool, rounds: int) -> float:
+    settings = {**DEFAULT_SETTINGS, "intra_op_threads": intra, "allow_spinning": spinning}
+    readers = [new_rapidocr({model: settings for model in MODELS}) for _ in range(workers)]
+    local = threading.local()
+    free = list(readers)
+    lock = threading.Lock()
+
+    def ocr(img):
+        if not hasattr(local, "reader"):
+            with lock:
+                local.reader = free.pop()
+        return local.reader(img)
+
+    with ThreadPoolExecutor(workers) as pool:
+        list(pool.map(ocr, pages[:workers]))  # first runs set up the sessions
+        start = time.perf_counter()
+        for _ in range(rounds):
+            list(pool.map(ocr, pages))
+        elapsed = time.perf_counter() - start
+    return len(pages) * rounds / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default="images/*/*.png")
+    parser.add_argument("--pages", type=int, default=8, help="screenshots OCR'd per round")
+    parser.add_argument("--rounds", type=int, default=2)
+    parser.add_argument("--cpus", type=int, default=len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count())
+    parser.add_argument("--write", metavar="PATH", help="write the best session settings to PATH")
+    args = parser.parse_args()
+
+    pages = [cv2.imread(path) for path in sorted(glob.glob(args.images))[: args.pages]]
+    print(f"{len(pages)} pages x {args.rounds} rounds on {args.cpus} CPUs")
+    results = []
+    for workers, intra, spinning in layouts(args.cpus):
+        pages_per_s = throughput(pages, workers, intra, spinning, args.rounds)
+        results.append((pages_per_s, workers, intra, spinning))
+        print(f"  workers {workers:2}  intra-op threads {intra:2}  spinning {'on ' if spinning else 'off'}  {pages_per_s:.2f} pages/s")
+
+    pages_per_s, workers, intra, spinning = max(results)
+    print(f"best: OCR_POOL_SIZE={workers} ORT_INTRA_OP_THREADS={intra} ORT_ALLOW_SPINNING={int(spinning)} ({pages_per_s:.2f} pages/s)")
+    if args.write:
+        with open(args.write, "w") as f:
+            json.dump({"intra_op_threads": intra, "allow_spinning": spinning}, f, indent=2)
+        print(f"wrote {args.write}; run the server with ORT_SETTINGS_FILE={args.write} OCR_POOL_SIZE={workers}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""Compares battle report page search with and without the header-strip probe.
+
+Run from the repository root:
+
+    python benchmarks/page_probe.py [images/test_battle_report]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import cv2
+
+from battle_report import find_report_pages
+
+
+def main():
+    report_dir = sys.argv[1] if len(sys.argv) > 1 else "images/test_battle_report"
+    files = sorted(os.path.join(report_dir, f) for f in os.listdir(report_dir) if f.endswith(("png", "jpg")))
+    images = [cv2.imread(f) for f in files]
+    print(f"{len(images)} images from {report_dir}")
+
+    for probe_pages in (False, True):
+        start = time.perf_counter()
+        pages = find_report_pages(images, stats_only=False, probe_pages=probe_pages)
+        elapsed = time.perf_counter() - start
+        print(
+            f"probe_pages={probe_pages!s:5}  "
+            f"stats found: {pages['stats'] is not None}  overview found: {pages['overview'] is not None}  "
+            f"full-page OCR calls: {pages['full_ocr_calls']}  skipped: {pages['full_ocr_skipped']} ({pages['duplicate_pages']} duplicates)  "
+            f"time: {elapsed:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Accuracy versus latency of the OCR preprocessing stage.
+
+OCRs the bundled screenshots once per target text height (and with and without
+grayscale), and compares each run with the unprocessed pages: how many text
+lines are still read identically, and how many parsed stat values (battle
+report stats and outcome, bonus overview stats) are unchanged. Run from the
+repository root:
+
+    python benchmarks/preprocess_report.py --targets 0 36 32 28 24 --grayscale both
+
+`--upscale 2` re-encodes every screenshot at twice its size first, to see what
+the stage does for high-resolution tablets. `--json` writes the rows to a file.
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import cv2
+
+from battle_report import classify_page, read_outcome, read_stats
+from bonus_overview import get_bonus_overview_stats
+from ocr import LazyImages, ocr_image
+from ocr_cache import ocr_cache
+from utils import handle_split_boxes
+
+
+def load(pattern: str, upscale: float) -> list[bytes]:
+    encoded = []
+    for path in sorted(glob.glob(pattern)):
+        if upscale == 1:
+            with open(path, "rb") as f:
+                encoded.append(f.read())
+            continue
+        img = cv2.imread(path)
+        img = cv2.resize(img, None, fx=upscale, fy=upscale, interpolation=cv2.INTER_CUBIC)
+        encoded.append(cv2.imencode(".png", img)[1].tobytes())
+    return encoded
+
+
+def ocr_all(encoded: list[bytes], target: float, grayscale: bool) -> tuple[list, list[float]]:
+    images = LazyImages(encoded, target_text_height=target, grayscale=grayscale)
+    results, latencies = [], []
+    for idx in range(len(images)):
+        start = time.perf_counter()
+        results.append(ocr_image(images[idx]))
+        latencies.append(time.perf_counter() - start)
+    return results, latencies
+
+
+def parsed_values(report: list, bonus: list) -> dict[tuple, float]:
+    values = {}
+    for idx, ocr_res in enumerate(report):
+        pages = classify_page(ocr_res)
+        try:
+            if "stats" in pages:
+                for side, troops in read_stats(handle_split_boxes(ocr_res)).items():
+                    for troop, stats in troops.items():
+                        values.update({(idx, side, troop, i): v for i, v in enumerate(stats)})
+            if "overview" in pages:
+                for side, outcome in read_outcome(handle_split_boxes(ocr_res)).items():
+                    values.update({(idx, side, key): v for key, v in outcome.items()})
+        except (ValueError, IndexError):
+            pass
+    for troop, stats in get_bonus_overview_stats(bonus).items():
+        values.update({("bonus", troop, i): v for i, v in enumerate(stats)})
+    return values
+
+
+def matching(reference: dict, candidate: dict) -> int:
+    return sum(candidate.get(key) == value for key, value in reference.items())
+
+
+def line_recall(reference: list, candidate: list) -> float:
+    found = total = 0
+    for ref_res, cand_res in zip(reference, candidate):
+        texts = {text for _, text, _ in cand_res}
+        found += sum(text in texts for _, text, _ in ref_res)
+        total += len(ref_res)
+    return found / total if total else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--report-images", default="images/test_battle_report/*.png")
+    parser.add_argument("--bonus-images", default="images/minime/*.png")
+    parser.add_argument("--targets", type=float, nargs="+", default=[0, 36, 32, 28, 24])
+    parser.add_argument("--grayscale", choices=["off", "on", "both"], default="both")
+    parser.add_argument("--upscale", type=float, default=1.0)
+    parser.add_argument("--json", help="write the result rows to this file")
+    args = parser.parse_args()
+
+    # Every configuration must really run OCR
+    ocr_cache.max_bytes = 0
+    ocr_cache.directory = None
+
+    report = load(args.report_images, args.upscale)
+    bonus = load(args.bonus_images, args.upscale)
+    print(f"{len(report)} battle report and {len(bonus)} bonus overview images, upscale {args.upscale}")
+
+    grayscale_modes = {"off": [False], "on": [True], "both": [False, True]}[args.grayscale]
+    configs = [(0.0, False)] + [(t, g) for t in args.targets for g in grayscale_modes if (t, g) != (0, False)]
+
+    rows, reference = [], None
+    for target, grayscale in configs:
+        report_res, report_lat = ocr_all(report, target, grayscale)
+        bonus_res, bonus_lat = ocr_all(bonus, target, grayscale)
+        results = report_res + bonus_res
+        latencies = report_lat + bonus_lat
+        values = parsed_values(report_res, bonus_res)
+        if reference is None:
+            reference = (results, values)
+        quantiles = statistics.quantiles(latencies, n=20) if len(latencies) > 1 else latencies * 19
+        row = {
+            "target_text_height": target,
+            "grayscale": grayscale,
+            "total_s": round(sum(latencies), 3),
+            "p50_s": round(statistics.median(latencies), 3),
+            "p95_s": round(quantiles[-1], 3),
+            "line_recall": round(line_recall(reference[0], results), 4),
+            "values_matching": matching(reference[1], values),
+            "values_total": len(reference[1]),
+        }
+        rows.append(row)
+        print(
+            f"target {target or 'off':>4}  grayscale {grayscale!s:5}  total {row['total_s']:7.2f}s  "
+            f"p50 {row['p50_s']:.2f}s  p95 {row['p95_s']:.2f}s  lines read identically {row['line_recall']:.1%}  "
+            f"stat values unchanged {row['values_matching']}/{row['values_total']}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
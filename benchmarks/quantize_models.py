@@ -0,0 +1,75 @@
+"""Writes INT8 copies of the RapidOCR models for `OCR_MODEL_DIR`. Experimental.
+
+Quantizes the detection, classification and recognition models shipped with
+rapidocr_onnxruntime with ONNX Runtime's dynamic quantization: weights are
+stored as 8-bit integers and activations are quantized on the fly, so no
+calibration images are needed. Needs the `quantize` extra (`onnx`). By default
+the detector is left as shipped and the recognizer only has its MatMul layers
+quantized: with 8-bit Conv weights the detector misplaces battle report boxes
+in full OCR and the recognizer misreads digits on the bundled screenshots.
+Models not written stay the shipped ones under `OCR_MODEL_DIR`. Run from the
+repository root:
+
+    python benchmarks/quantize_models.py --output models/int8
+    python benchmarks/quantized_gate.py --models models/int8
+
+On the CPUs measured so far the INT8 models were slower than the shipped ones
+(0.47x-0.99x), so this is not a recommended speedup. Check every quantized set
+with `benchmarks/quantized_gate.py`, for accuracy and speed, before serving it.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from ort_settings import MODELS, shipped_model_paths
+
+# Operator types quantized in each model (None: every type ONNX Runtime supports)
+QUANTIZED_OPS: dict[str, list[str] | None] = {"det": None, "cls": None, "rec": ["MatMul"]}
+
+
+def quantize(source: str, target: str, weight_type: str, op_types: list[str] | None) -> None:
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # The shipped models feed some Conv weights through other nodes; the
+        # pre-processing pass folds them into initializers the quantizer can read
+        prepared = os.path.join(tmp, "prepared.onnx")
+        quant_pre_process(source, prepared, skip_symbolic_shape=True)
+        quantize_dynamic(
+            prepared,
+            target,
+            op_types_to_quantize=op_types,
+            weight_type=QuantType.QInt8 if weight_type == "int8" else QuantType.QUInt8,
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="models/int8", help="directory to write det.onnx, cls.onnx and rec.onnx to")
+    parser.add_argument("--models", default="cls,rec", help=f"comma-separated models to quantize, of {', '.join(MODELS)}")
+    parser.add_argument("--weight-type", choices=("uint8", "int8"), default="uint8")
+    parser.add_argument("--op-types", help="comma-separated operator types to quantize in every model (e.g. Conv,MatMul)")
+    args = parser.parse_args()
+
+    models = args.models.split(",")
+    unknown = set(models) - set(MODELS)
+    if unknown:
+        parser.error(f"unknown models: {', '.join(sorted(unknown))}")
+    # RapidOCR's own models, even when OCR_MODEL_DIR points at the output
+    sources = shipped_model_paths()
+    os.makedirs(args.output, exist_ok=True)
+    for model in models:
+        target = os.path.join(args.output, f"{model}.onnx")
+        op_types = args.op_types.split(",") if args.op_types else QUANTIZED_OPS[model]
+        quantize(sources[model], target, args.weight_type, op_types)
+        before, after = os.path.getsize(sources[model]), os.path.getsize(target)
+        print(f"{model}: {os.path.basename(sources[model])} {before / 1e6:.1f} MB -> {target} {after / 1e6:.1f} MB")
+    print(f"run with OCR_MODEL_DIR={args.output} once benchmarks/quantized_gate.py passes")
+
+
+if __name__ == "__main__":
+    main()
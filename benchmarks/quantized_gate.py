@@ -0,0 +1,110 @@
+"""Accuracy gate for replacement OCR models, e.g. the INT8 ones from quantize_models.py.
+
+Runs `parse_bonus_overview` on images/minime and `parse_battle_report` on
+images/test_battle_report once with the models shipped with RapidOCR and once
+with the models in `--models` (as `OCR_MODEL_DIR` would load them), each in its
+own process with the OCR cache off. Both run once with the server defaults and
+once with layout templates, glyph matching and stitching off, so every page goes
+through the replacement detector and recognizer. Every parsed Stats and
+BattleOutcome value must be the same in both configurations; differences are
+listed and the script exits with status 1. Also reports each suite's median
+time with both model sets. Run from the repository root:
+
+    python benchmarks/quantized_gate.py --models models/int8 --repeat 3
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from e2e import SUITES, load_b64
+
+# Environments the model sets are compared in. With the defaults most value cells are
+# read by glyph matching and bonus overview canvases skip detection; "full_ocr"
+# sends every page through detection and recognition.
+CONFIGS = {
+    "defaults": {},
+    "full_ocr": {"LAYOUT_TEMPLATES": "0", "GLYPH_MATCHING": "0", "STITCH_PAGES": "0"},
+}
+
+
+def run_suites(repeat: int) -> dict:
+    from ocr_cache import ocr_cache
+
+    ocr_cache.max_bytes = 0
+    ocr_cache.directory = None
+    results = {}
+    for name, (pattern, run) in SUITES.items():
+        images_b64 = load_b64(pattern)
+        times, output = [], None
+        try:
+            run(images_b64)  # load the models
+            for _ in range(repeat):
+                start = time.perf_counter()
+                output = run(images_b64)
+                times.append(time.perf_counter() - start)
+        except ValueError as e:
+            # Misread text the parser cannot make sense of fails the gate too
+            results[name] = {"output": {"error": str(e)}, "p50_s": None}
+            continue
+        results[name] = {"output": output, "p50_s": statistics.median(times)}
+    return results
+
+
+def run_with_models(model_dir: str, config: dict[str, str], repeat: int) -> dict:
+    env = {**os.environ, **config, "OCR_MODEL_DIR": model_dir}
+    env.pop("OCR_CACHE_DIR", None)
+    completed = subprocess.run(
+        [sys.executable, __file__, "--dump", "--repeat", str(repeat)],
+        env=env, stdout=subprocess.PIPE, text=True, check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def differences(expected: object, actual: object, path: str) -> list[str]:
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        found = []
+        for key in sorted(set(expected) | set(actual)):
+            found += differences(expected.get(key), actual.get(key), f"{path}.{key}")
+        return found
+    return [] if expected == actual else [f"{path}: {expected!r} -> {actual!r}"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--models", default="models/int8", help="directory of det.onnx, cls.onnx and rec.onnx")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--dump", action="store_true", help="run the suites with OCR_MODEL_DIR and print the outputs as JSON")
+    args = parser.parse_args()
+
+    if args.dump:
+        print(json.dumps(run_suites(args.repeat)))
+        return
+    if not os.path.isdir(args.models):
+        parser.error(f"{args.models} does not exist; write it with benchmarks/quantize_models.py")
+
+    found = []
+    for config_name, config in CONFIGS.items():
+        shipped = run_with_models("", config, args.repeat)
+        replaced = run_with_models(args.models, config, args.repeat)
+        for name in SUITES:
+            before, after = shipped[name], replaced[name]
+            diffs = differences(before["output"], after["output"], f"{config_name}.{name}")
+            found += diffs
+            timing = f"shipped p50 {before['p50_s']:.3f}s" if before["p50_s"] is not None else "shipped failed"
+            if before["p50_s"] is not None and after["p50_s"] is not None:
+                timing += f"  {args.models} p50 {after['p50_s']:.3f}s  speedup {before['p50_s'] / after['p50_s']:.2f}x"
+            print(f"{config_name:9} {name:15} {timing}  {f'{len(diffs)} values differ' if diffs else 'same values'}")
+    for diff in found:
+        print(f"  {diff}")
+    if found:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Benchmarks handle_split_boxes against the original pairwise implementation.
+
+Generates synthetic pages of text rows whose words are split into touching
+fragments, checks both implementations agree, and times them as the number of
+detections grows. Run from the repository root:
+
+    python benchmarks/split_boxes.py
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from utils import handle_split_boxes, handle_split_boxes_pairwise
+
+
+def synthetic_page(n_boxes: int, seed: int = 0) -> list:
+    """Rows of 2-4 word groups; each group is split into 1-3 fragments 5px apart."""
+    rng = random.Random(seed)
+    results = []
+    y = 10.0
+    while len(results) < n_boxes:
+        height = rng.uniform(25, 40)
+        x = rng.uniform(10, 60)
+        for _ in range(rng.randint(2, 4)):
+            for _ in range(rng.randint(1, 3)):
+                width = rng.uniform(30, 120)
+                results.append((
+                    [[x, y], [x + width, y], [x + width, y + height], [x, y + height]],
+                    f"w{len(results)}",
+                    rng.uniform(0.8, 1.0),
+                ))
+                x += width + 5
+            x += rng.uniform(80, 200)
+        y += height + rng.uniform(20, 40)
+    return results[:n_boxes]
+
+
+def best_of(fn, arg, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print(f"{'detections':>10} {'pairwise (ms)':>14} {'row sweep (ms)':>15} {'speedup':>8}")
+    for n in (25, 50, 100, 200, 400, 800):
+        page = synthetic_page(n, seed=n)
+        assert handle_split_boxes(page) == handle_split_boxes_pairwise(page)
+        repeat = 5 if n <= 200 else 2
+        old = best_of(handle_split_boxes_pairwise, page, repeat)
+        new = best_of(handle_split_boxes, page, repeat)
+        print(f"{n:>10} {old * 1000:>14.2f} {new * 1000:>15.2f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Per-page OCR versus stitched OCR of overlapping bonus overview screenshots.
+
+OCRs the screenshots in images/minime one by one (stats merged by taking the
+highest value) and as canvases of their distinct rows (see `stitch.stitch_pages`),
+with the OCR cache off. Reports the time, how many pages were OCR'd, how many
+value and label cells went to the recognizer or glyph matching, and whether the
+parsed stats agree with benchmarks/golden. Run from the repository root:
+
+    python benchmarks/stitch.py --repeat 3
+"""
+import argparse
+import glob
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from prometheus_client import REGISTRY
+
+from bonus_overview import BONUS_OVERVIEW_LAYOUT, get_bonus_overview_stats
+from ocr import LazyImages, ocr_images_iter
+from ocr_cache import ocr_cache
+from stitch import stitch_pages
+
+GOLDEN = os.path.join(os.path.dirname(__file__), "golden", "bonus_overview.json")
+
+
+def cells_read() -> dict[str, float]:
+    return {
+        result: REGISTRY.get_sample_value("stats_parser_glyph_cells_total", {"result": result}) or 0.0
+        for result in ("glyphs", "ocr")
+    }
+
+
+def run(encoded: list[bytes], stitched: bool, engine: str) -> tuple[float, int, dict[str, float], dict]:
+    before = cells_read()
+    start = time.perf_counter()
+    pages = LazyImages(encoded)
+    if stitched:
+        pages = stitch_pages(pages)
+    images_text = list(ocr_images_iter(pages, engine, layouts=(BONUS_OVERVIEW_LAYOUT,)))
+    stats = get_bonus_overview_stats(images_text)
+    elapsed = time.perf_counter() - start
+    after = cells_read()
+    return elapsed, len(images_text), {k: after[k] - before[k] for k in after}, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", default="images/minime/*.png")
+    parser.add_argument("--engine", default="rapidocr")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    ocr_cache.max_bytes = 0
+    ocr_cache.directory = None
+    encoded = []
+    for path in sorted(glob.glob(args.images)):
+        with open(path, "rb") as f:
+            encoded.append(f.read())
+    with open(GOLDEN) as f:
+        golden = json.load(f)
+    print(f"{len(encoded)} screenshots from {args.images}")
+
+    run(encoded, False, args.engine)  # load the models
+    for stitched in (False, True):
+        times = []
+        for _ in range(args.repeat):
+            elapsed, pages, cells, stats = run(encoded, stitched, args.engine)
+            times.append(elapsed)
+        print(
+            f"{'stitched' if stitched else 'per page':8}  p50 {statistics.median(times):.3f}s  "
+            f"pages OCR'd {pages}  cells: {cells['ocr']:.0f} recognized, {cells['glyphs']:.0f} glyph-matched  "
+            f"golden {'ok' if stats == golden['stats'] else 'MISMATCH'}"
+        )
+
+
+if __name__ == "__main__":
+    main()
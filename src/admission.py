@@ -0,0 +1,159 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+
+from fastapi.responses import JSONResponse
+
+from metrics import ADMISSION_QUEUED, ADMISSION_REJECTED
+from ocr_pool import OCR_POOL_SIZE
+from schemas.errors import ErrorResponse
+
+
+ADMISSION_CONTROL = os.environ.get("ADMISSION_CONTROL", "1") == "1"
+MAX_ACTIVE_REQUESTS = int(os.environ.get("MAX_ACTIVE_REQUESTS", OCR_POOL_SIZE))
+MAX_QUEUED_REQUESTS = int(os.environ.get("MAX_QUEUED_REQUESTS", 64))
+QUEUE_WAIT_BUDGET_S = float(os.environ.get("QUEUE_WAIT_BUDGET_S", 30))
+# Header identifying the client for fair queuing (e.g. X-Forwarded-For behind a proxy);
+# by default the peer address is used
+CLIENT_ID_HEADER = os.environ.get("CLIENT_ID_HEADER", "").lower()
+
+
+class Overloaded(Exception):
+    """Raised when a request would wait longer than the queue wait budget."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("server is busy, try again later.")
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """Limits how many parse requests run at once and queues the rest fairly.
+
+    Waiting requests are queued per client and admitted round-robin across
+    clients, so one client sending a burst does not hold back everyone else.
+    A new request is rejected (`Overloaded`) when the queue is full or its
+    estimated wait exceeds `wait_budget_s`. The estimate uses a moving average
+    of request durations. Runs on the event loop; not thread-safe.
+    """
+
+    def __init__(
+        self,
+        max_active: int = MAX_ACTIVE_REQUESTS,
+        max_queued: int = MAX_QUEUED_REQUESTS,
+        wait_budget_s: float = QUEUE_WAIT_BUDGET_S,
+        initial_service_s: float = 10.0,
+    ):
+        self.max_active = max(1, max_active)
+        self.max_queued = max_queued
+        self.wait_budget_s = wait_budget_s
+        self.service_s = initial_service_s
+        self.active = 0
+        self.queued = 0
+        self._queues: OrderedDict[str, deque[asyncio.Future]] = OrderedDict()
+
+    def estimated_wait(self, client: str) -> float:
+        """Seconds a new request from `client` would wait, given round-robin admission."""
+        if self.active < self.max_active and not self.queued:
+            return 0.0
+        own = len(self._queues.get(client, ()))
+        ahead = own + sum(min(len(queue), own + 1) for c, queue in self._queues.items() if c != client)
+        return (ahead + 1) * self.service_s / self.max_active
+
+    async def acquire(self, client: str) -> None:
+        if self.active < self.max_active and not self.queued:
+            self.active += 1
+            return
+        wait = self.estimated_wait(client)
+        if self.queued >= self.max_queued or wait > self.wait_budget_s:
+            ADMISSION_REJECTED.inc()
+            raise Overloaded(retry_after=max(1.0, wait - self.wait_budget_s))
+
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(client, deque()).append(future)
+        self._set_queued(self.queued + 1)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Admitted just as the client went away
+                self.release(None)
+            else:
+                self._remove(client, future)
+            raise
+
+    def release(self, duration: float | None) -> None:
+        if duration is not None:
+            self.service_s = 0.8 * self.service_s + 0.2 * duration
+        self.active -= 1
+        while self._queues and self.active < self.max_active:
+            client, queue = self._queues.popitem(last=False)
+            future = queue.popleft()
+            if queue:
+                self._queues[client] = queue
+            self._set_queued(self.queued - 1)
+            if future.cancelled():
+                # Its task has not run its cleanup yet; `_remove` will find nothing to do
+                continue
+            future.set_result(None)
+            self.active += 1
+
+    def _remove(self, client: str, future: asyncio.Future) -> None:
+        queue = self._queues.get(client)
+        if queue is not None and future in queue:
+            queue.remove(future)
+            self._set_queued(self.queued - 1)
+            if not queue:
+                del self._queues[client]
+
+    def _set_queued(self, queued: int) -> None:
+        self.queued = queued
+        ADMISSION_QUEUED.set(queued)
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying an `AdmissionController` to requests under `path_prefix`.
+
+    The slot is held until the response body is fully sent, so streamed
+    responses count for as long as they run. Rejected requests get a 429
+    `rate_limited` error with a Retry-After header.
+    """
+
+    def __init__(self, app, controller: AdmissionController, path_prefix: str = "/api/v1/read_"):
+        self.app = app
+        self.controller = controller
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            await self.controller.acquire(_client_id(scope))
+        except Overloaded as exc:
+            payload = ErrorResponse(code="rate_limited", detail=str(exc))
+            response = JSONResponse(
+                status_code=429,
+                content=payload.model_dump(),
+                headers={"Retry-After": str(math.ceil(exc.retry_after))},
+            )
+            await response(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(time.perf_counter() - start)
+
+
+def _client_id(scope) -> str:
+    if CLIENT_ID_HEADER:
+        for name, value in scope.get("headers", []):
+            if name.decode("latin-1") == CLIENT_ID_HEADER:
+                # For X-Forwarded-For style lists, the first entry is the original client
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
@@ -1,12 +1,25 @@
-from fastapi import FastAPI, HTTPException, Request
+import asyncio
+import base64
+import json
+import os
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Iterator, List
+
+from fastapi import FastAPI, File, Form, HTTPException, Path, Query, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from starlette.concurrency import run_in_threadpool
 
-from bonus_overview import parse_bonus_overview
+from bonus_overview import parse_bonus_overview_images, parse_bonus_overview_until_complete, parse_bonus_overview_video
 from battle_report import (
+    iter_battle_report,
     parse_battle_report,
+    parse_battle_report_images,
 )
+from ocr import LazyImages, split_image_bundle, warm_up
 from schemas.inputs import (
     ReadStatsFromReportRequest,
     ReadStatsFromBonusOverviewRequest,
@@ -16,11 +29,40 @@ from schemas.outputs import (
     BonusOverviewOutput,
     BattleReportOutput,
     BattleOutcome,
+    OCRCacheStats,
+    JobStatus,
 )
 from schemas.errors import ErrorResponse, ErrorDetail
 from error_messages import missing_page_message_from_value_error
+from ocr_cache import ocr_cache
+from memory_budget import MemoryBudgetExceeded
+from admission import ADMISSION_CONTROL, AdmissionController, AdmissionMiddleware
+from metrics import REQUEST_SECONDS
+from timings import StageTimings, collect_timings, iter_collecting
+from jobs import JobFailed, JobStore, JobWorkers
+
+OCR_WARMUP = os.environ.get("OCR_WARMUP", "1") == "1"
+PREFORK_WORKERS = int(os.environ.get("PREFORK_WORKERS", 0))
+# Longest a job status request may long-poll for the job to finish
+JOB_MAX_WAIT_S = float(os.environ.get("JOB_MAX_WAIT_S", 30))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load and exercise the OCR engines before the server starts accepting requests,
+    # unless this is a pre-fork worker whose parent already did
+    if OCR_WARMUP and not getattr(app.state, "ocr_warmed", False):
+        await run_in_threadpool(warm_up)
+    job_workers.start()
+    yield
+    job_workers.stop(timeout=5)
+
+
+app = FastAPI(title="Report Reader API", version="1.0", lifespan=lifespan)
 
-app = FastAPI(title="Report Reader API", version="1.0")
+# Added before CORS so that 429 responses still get CORS headers
+if ADMISSION_CONTROL:
+    app.add_middleware(AdmissionMiddleware, controller=AdmissionController())
 
 allowed_origins = ["https://stats-parser.neptunedevs.com", "http://stats-parser.neptunedevs.com", "https://sim.tundra.land", "sim.tundra.land", "localhost:8000"]
 # Enable CORS for all origins
@@ -29,14 +71,44 @@ app.add_middleware(
     allow_origins=allowed_origins,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "Retry-After"],
 )
 
+# Clients that send this header get the request's stage timings back in a Server-Timing
+# header, or in a final `timings` event from streaming endpoints
+TIMINGS_REQUEST_HEADER = "x-include-timings"
+# Bodies still being produced after the middleware returns, so the header would be incomplete
+STREAMING_MEDIA_TYPES = ("application/x-ndjson", "text/event-stream")
+
+
+def timings_requested(request: Request) -> bool:
+    return request.headers.get(TIMINGS_REQUEST_HEADER, "").lower() in ("1", "true")
+
+
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    with collect_timings() as timings:
+        start = time.perf_counter()
+        response = await call_next(request)
+        elapsed = time.perf_counter() - start
+    route = request.scope.get("route")
+    REQUEST_SECONDS.labels(route.path if route is not None else "unmatched").observe(elapsed)
+    streaming = response.headers.get("content-type", "").startswith(STREAMING_MEDIA_TYPES)
+    if timings_requested(request) and not streaming:
+        entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.as_dict().items()]
+        entries.append(f"total;dur={elapsed * 1000:.1f}")
+        response.headers["Server-Timing"] = ", ".join(entries)
+    return response
+
+
 # Common error responses to attach to routes
 COMMON_ERROR_RESPONSES = {
     400: {"model": ErrorResponse, "description": "Bad Request"},
     404: {"model": ErrorResponse, "description": "Not Found"},
     422: {"model": ErrorResponse, "description": "Validation Error"},
+    429: {"model": ErrorResponse, "description": "Too Many Requests"},
     500: {"model": ErrorResponse, "description": "Internal Server Error"},
+    503: {"model": ErrorResponse, "description": "Service Unavailable"},
 }
 
 @app.exception_handler(RequestValidationError)
@@ -60,6 +132,7 @@ async def http_exception_handler(request: Request, exc: HTTPException):
         422: "validation_error",
         429: "rate_limited",
         500: "internal_server_error",
+        503: "service_unavailable",
     }.get(exc.status_code, "error")
     payload = ErrorResponse(code=code, detail=detail_str)
     return JSONResponse(status_code=exc.status_code, content=payload.model_dump())
@@ -73,6 +146,12 @@ async def value_error_handler(request: Request, exc: ValueError):
     return JSONResponse(status_code=400, content=payload.model_dump())
 
 
+@app.exception_handler(MemoryBudgetExceeded)
+async def memory_budget_exceeded_handler(request: Request, exc: MemoryBudgetExceeded):
+    payload = ErrorResponse(code="service_unavailable", detail=str(exc))
+    return JSONResponse(status_code=503, content=payload.model_dump())
+
+
 @app.exception_handler(Exception)
 async def unhandled_exception_handler(request: Request, exc: Exception):
     payload = ErrorResponse(code="internal_server_error", detail="An unexpected error occurred")
@@ -86,8 +165,15 @@ async def unhandled_exception_handler(request: Request, exc: Exception):
     responses=COMMON_ERROR_RESPONSES,
 )
 def read_bonus_overview(request: ReadStatsFromBonusOverviewRequest) -> BonusOverviewOutput:
-    images_b64 = [img.image_data for img in request.images]
-    stats = parse_bonus_overview(images_b64, request.ocr_engine)
+    images = LazyImages.from_b64([img.image_data for img in request.images])
+    return bonus_overview_output(images, request.ocr_engine, request.fuzzy_keys, request.early_exit)
+
+
+def bonus_overview_output(images: list[Any], ocr_engine: str, fuzzy_keys: bool, early_exit: bool) -> BonusOverviewOutput:
+    if early_exit:
+        stats, skipped = parse_bonus_overview_until_complete(images, ocr_engine, fuzzy_keys)
+        return BonusOverviewOutput.from_stats_dict(stats, skipped_images=skipped)
+    stats = parse_bonus_overview_images(images, ocr_engine, fuzzy_keys)
     return BonusOverviewOutput.from_stats_dict(stats)
 
 @app.post(
@@ -102,16 +188,280 @@ def read_battle_report(request: ReadStatsFromReportRequest) -> BattleReportOutpu
         ocr_engine=request.ocr_engine,
         stats_only=request.stats_only,
     )
+    return battle_report_output(stats, outcome)
+
+
+@app.post(
+    "/api/v1/read_battle_report/stream",
+    responses={
+        200: {
+            "description": "One event per line (NDJSON), or Server-Sent Events when the client accepts text/event-stream",
+            "content": {"application/x-ndjson": {}, "text/event-stream": {}},
+        },
+        **COMMON_ERROR_RESPONSES,
+    },
+)
+def stream_battle_report(request: ReadStatsFromReportRequest, http_request: Request) -> StreamingResponse:
+    """Streams battle report results as each page is recognized and parsed.
+
+    Events are `page_classified`, `stats` (left/right `Stats`), `outcome`
+    (`BattleOutcome`), then `done`, or `error` with an `ErrorResponse` if
+    parsing fails part way. With `X-Include-Timings: 1`, a final `timings` event
+    holds the stage timings instead of a Server-Timing header.
+    """
+    images_b64 = [img.image_data for img in request.images]
+    events = battle_report_events(images_b64, request.ocr_engine, request.stats_only)
+    if timings_requested(http_request):
+        events = with_timings_event(events)
+    if "text/event-stream" in http_request.headers.get("accept", ""):
+        body = (f"event: {name}\ndata: {json.dumps(data)}\n\n" for name, data in events)
+        return StreamingResponse(body, media_type="text/event-stream")
+    body = (json.dumps({"event": name, **data}) + "\n" for name, data in events)
+    return StreamingResponse(body, media_type="application/x-ndjson")
+
+
+def with_timings_event(events: Iterator[tuple[str, dict[str, Any]]]) -> Iterator[tuple[str, dict[str, Any]]]:
+    """Passes `events` through, then adds a `timings` event with the stage timings in
+    milliseconds, as the Server-Timing header has them for other endpoints."""
+    timings = StageTimings()
+    start = time.perf_counter()
+    yield from iter_collecting(events, timings)
+    elapsed = time.perf_counter() - start
+    stages = {stage: round(seconds * 1000, 1) for stage, seconds in timings.as_dict().items()}
+    yield "timings", {"stages_ms": stages, "total_ms": round(elapsed * 1000, 1)}
+
+
+def battle_report_events(images_b64: list[str], ocr_engine: str, stats_only: bool) -> Iterator[tuple[str, dict[str, Any]]]:
+    """Maps `iter_battle_report` events to (event name, JSON payload) pairs."""
+    try:
+        images = LazyImages.from_b64(images_b64)
+        for event in iter_battle_report(images, ocr_engine, stats_only):
+            name = event["event"]
+            if name == "stats":
+                stats = event["stats"]
+                yield name, {
+                    "left_stats": Stats.from_dict(stats["left"]).model_dump(),
+                    "right_stats": Stats.from_dict(stats["right"]).model_dump(),
+                }
+            elif name == "outcome":
+                yield name, {"troops_outcome": BattleOutcome.from_dict(event["outcome"]).model_dump()}
+            else:
+                yield name, {k: v for k, v in event.items() if k != "event"}
+    except MemoryBudgetExceeded as exc:
+        yield "error", ErrorResponse(code="service_unavailable", detail=str(exc)).model_dump()
+    except ValueError as exc:
+        friendly = missing_page_message_from_value_error(exc)
+        yield "error", ErrorResponse(code="bad_request", detail=friendly or str(exc)).model_dump()
+    except Exception:
+        yield "error", ErrorResponse(code="internal_server_error", detail="An unexpected error occurred").model_dump()
+
+
+def battle_report_output(stats: dict, outcome: dict | None) -> BattleReportOutput:
     return BattleReportOutput(
         left_stats=Stats.from_dict(stats["left"]),
         right_stats=Stats.from_dict(stats["right"]),
         troops_outcome=BattleOutcome.from_dict(outcome) if outcome is not None else None,
     )
 
+
+# Binary variants: images arrive as raw files instead of base64 inside JSON, and are
+# decoded straight from the request buffer as each one is OCR'd.
+BUNDLE_BODY = {
+    "requestBody": {
+        "description": "Images as frames of a 4-byte big-endian length followed by the encoded image bytes",
+        "content": {"application/octet-stream": {"schema": {"type": "string", "format": "binary"}}},
+        "required": True,
+    }
+}
+
+@app.post(
+    "/api/v1/read_bonus_overview/upload",
+    response_model=BonusOverviewOutput,
+    responses=COMMON_ERROR_RESPONSES,
+)
+def upload_bonus_overview(
+    images: List[UploadFile] = File(..., description="Image files (PNG, JPG, etc.)"),
+    ocr_engine: str = Form(default="rapidocr"),
+    fuzzy_keys: bool = Form(default=False),
+    early_exit: bool = Form(default=False),
+) -> BonusOverviewOutput:
+    decoded = LazyImages([image.file.read() for image in images])
+    return bonus_overview_output(decoded, ocr_engine, fuzzy_keys, early_exit)
+
+@app.post(
+    "/api/v1/read_bonus_overview/video",
+    response_model=BonusOverviewOutput,
+    responses=COMMON_ERROR_RESPONSES,
+)
+def video_bonus_overview(
+    video: UploadFile = File(..., description="Screen recording of the bonus overview being scrolled (MP4, MOV, WebM, etc.)"),
+    ocr_engine: str = Form(default="rapidocr"),
+    fuzzy_keys: bool = Form(default=False),
+) -> BonusOverviewOutput:
+    """Reads a screen recording instead of screenshots; only frames that show new rows are OCR'd."""
+    stats = parse_bonus_overview_video(video.file, ocr_engine, fuzzy_keys)
+    return BonusOverviewOutput.from_stats_dict(stats)
+
+@app.post(
+    "/api/v1/read_battle_report/upload",
+    response_model=BattleReportOutput,
+    responses=COMMON_ERROR_RESPONSES,
+)
+def upload_battle_report(
+    images: List[UploadFile] = File(..., description="Image files (PNG, JPG, etc.)"),
+    ocr_engine: str = Form(default="rapidocr"),
+    stats_only: bool = Form(default=True),
+) -> BattleReportOutput:
+    decoded = LazyImages([image.file.read() for image in images])
+    stats, outcome = parse_battle_report_images(decoded, ocr_engine, stats_only)
+    return battle_report_output(stats, outcome)
+
+@app.post(
+    "/api/v1/read_bonus_overview/raw",
+    response_model=BonusOverviewOutput,
+    responses=COMMON_ERROR_RESPONSES,
+    openapi_extra=BUNDLE_BODY,
+)
+async def raw_bonus_overview(
+    request: Request,
+    ocr_engine: str = Query(default="rapidocr"),
+    fuzzy_keys: bool = Query(default=False),
+    early_exit: bool = Query(default=False),
+) -> BonusOverviewOutput:
+    bundle = await request.body()
+
+    def run() -> BonusOverviewOutput:
+        decoded = LazyImages(split_image_bundle(bundle))
+        return bonus_overview_output(decoded, ocr_engine, fuzzy_keys, early_exit)
+
+    return await run_in_threadpool(run)
+
+@app.post(
+    "/api/v1/read_battle_report/raw",
+    response_model=BattleReportOutput,
+    responses=COMMON_ERROR_RESPONSES,
+    openapi_extra=BUNDLE_BODY,
+)
+async def raw_battle_report(
+    request: Request,
+    ocr_engine: str = Query(default="rapidocr"),
+    stats_only: bool = Query(default=True),
+) -> BattleReportOutput:
+    bundle = await request.body()
+
+    def run() -> BattleReportOutput:
+        decoded = LazyImages(split_image_bundle(bundle))
+        stats, outcome = parse_battle_report_images(decoded, ocr_engine, stats_only)
+        return battle_report_output(stats, outcome)
+
+    return await run_in_threadpool(run)
+
+# Job API: the images are queued in the node's job store and parsed by whichever
+# worker claims them, while the client polls for the result.
+def run_battle_report_job(images: list[memoryview], params: dict[str, Any]) -> dict[str, Any]:
+    with job_errors():
+        stats, outcome = parse_battle_report_images(LazyImages(images), params["ocr_engine"], params["stats_only"])
+    return battle_report_output(stats, outcome).model_dump()
+
+
+def run_bonus_overview_job(images: list[memoryview], params: dict[str, Any]) -> dict[str, Any]:
+    with job_errors():
+        output = bonus_overview_output(LazyImages(images), params["ocr_engine"], params["fuzzy_keys"], params["early_exit"])
+    return output.model_dump()
+
+
+@contextmanager
+def job_errors() -> Iterator[None]:
+    """Turns parser errors into the error payload stored with a failed job."""
+    try:
+        yield
+    except MemoryBudgetExceeded as exc:
+        raise JobFailed(ErrorResponse(code="service_unavailable", detail=str(exc)).model_dump()) from exc
+    except ValueError as exc:
+        friendly = missing_page_message_from_value_error(exc)
+        raise JobFailed(ErrorResponse(code="bad_request", detail=friendly or str(exc)).model_dump()) from exc
+
+
+job_store = JobStore()
+job_workers = JobWorkers(job_store, {
+    "battle_report": run_battle_report_job,
+    "bonus_overview": run_bonus_overview_job,
+})
+
+
+def submit_job(kind: str, images_b64: list[str], params: dict[str, Any], response: Response) -> JobStatus:
+    images = [base64.b64decode(data) for data in images_b64]
+    if not all(images):
+        raise ValueError("image data is empty.")
+    job_id = job_store.submit(kind, images, params)
+    job_workers.notify()
+    response.headers["Location"] = f"/api/v1/jobs/{job_id}"
+    return JobStatus(**job_store.get(job_id))
+
+
+@app.post(
+    "/api/v1/jobs/battle_report",
+    response_model=JobStatus,
+    status_code=202,
+    responses=COMMON_ERROR_RESPONSES,
+)
+def submit_battle_report_job(request: ReadStatsFromReportRequest, response: Response) -> JobStatus:
+    """Queues a battle report and returns its job at once; poll `GET /api/v1/jobs/{job_id}` for the result."""
+    params = {"ocr_engine": request.ocr_engine, "stats_only": request.stats_only}
+    return submit_job("battle_report", [img.image_data for img in request.images], params, response)
+
+
+@app.post(
+    "/api/v1/jobs/bonus_overview",
+    response_model=JobStatus,
+    status_code=202,
+    responses=COMMON_ERROR_RESPONSES,
+)
+def submit_bonus_overview_job(request: ReadStatsFromBonusOverviewRequest, response: Response) -> JobStatus:
+    """Queues bonus overview images and returns their job at once; poll `GET /api/v1/jobs/{job_id}` for the result."""
+    params = {"ocr_engine": request.ocr_engine, "fuzzy_keys": request.fuzzy_keys, "early_exit": request.early_exit}
+    return submit_job("bonus_overview", [img.image_data for img in request.images], params, response)
+
+
+@app.get(
+    "/api/v1/jobs/{job_id}",
+    response_model=JobStatus,
+    responses=COMMON_ERROR_RESPONSES,
+)
+async def read_job(
+    job_id: str = Path(..., description="Job id returned on submission"),
+    wait: float = Query(default=0, ge=0, description=f"Seconds to wait for the job to finish before answering (at most {JOB_MAX_WAIT_S:g})"),
+) -> JobStatus:
+    deadline = time.monotonic() + min(wait, JOB_MAX_WAIT_S)
+    while True:
+        job = await run_in_threadpool(job_store.get, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="job not found.")
+        if job["status"] in ("done", "failed") or time.monotonic() >= deadline:
+            return JobStatus(**job)
+        await asyncio.sleep(min(0.25, max(0.0, deadline - time.monotonic())))
+
+
+@app.get(
+    "/api/v1/ocr_cache/stats",
+    response_model=OCRCacheStats,
+)
+def read_ocr_cache_stats() -> OCRCacheStats:
+    return OCRCacheStats(**ocr_cache.stats())
+
+@app.get("/metrics", include_in_schema=False)
+def metrics() -> Response:
+    """Prometheus metrics of this server process."""
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(
-        "api:app",
-        host="0.0.0.0",
-        port=8001,
-    )
+    if PREFORK_WORKERS > 0:
+        from prefork import serve
+        serve(app, host="0.0.0.0", port=8001, workers=PREFORK_WORKERS)
+    else:
+        import uvicorn
+        uvicorn.run(
+            "api:app",
+            host="0.0.0.0",
+            port=8001,
+        )
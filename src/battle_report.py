@@ -1,7 +1,15 @@
-from typing import Any
+from contextlib import closing
+from typing import Any, Iterator
+import logging
 
-from utils import handle_split_boxes
-from ocr import ocr_image, decode_images_from_b64
+from utils import handle_split_boxes, compile_label_pattern
+from timings import timed
+from metrics import IMAGES_PER_REQUEST, PAGES_OCR
+from ocr import LazyImages, ocr_pool, ocr_header_strip, ocr_images_iter, ocr_page, request_concurrency
+from layout import LayoutTemplate
+from dedup import PageDeduper
+
+logger = logging.getLogger(__name__)
 
 KEYS = [    
     "Infantry Attack", "Infantry Defense", "Infantry Lethality", "Infantry Health",
@@ -9,57 +17,298 @@ KEYS = [
     "Marksman Attack", "Marksman Defense", "Marksman Lethality", "Marksman Health"
 ]
 
+# Lowercase label on the stats page -> (troop type, index in the stats list).
+# Add labels for other report variants or languages here.
+STAT_LABELS = {
+    f"{troop} {stat}": (troop, stat_idx)
+    for troop in ("infantry", "lancer", "marksman")
+    for stat_idx, stat in enumerate(("attack", "defense", "lethality", "health"))
+}
+
+# Lowercase label on the battle overview page -> outcome field.
+OUTCOME_LABELS = {
+    "troops": "initial_troops",
+    "losses": "losses",
+    "injured": "injured",
+    "lightly injured": "lightly_injured",
+    "survivors": "survivors",
+}
+
+STAT_LABEL_PATTERN = compile_label_pattern(STAT_LABELS)
+OUTCOME_LABEL_PATTERN = compile_label_pattern(OUTCOME_LABELS)
+
+# Cleanup of stat value cells ("+245.3%"). Stats have no thousands separators, so a
+# "," is a misread "." and must fail rather than shift the decimal point.
+STAT_FORMAT_MAP = str.maketrans({"%": "", "+": ""})
+# Cleanup of troop count cells ("871,171"); OCR often reads "0" as "o"
+COUNT_FORMAT_MAP = str.maketrans(
+    {
+        "%": "",
+        "+": "",
+        ",": "",
+        "o": "0",
+        "O": "0",
+    }
+)
+
+# Lowercase text that identifies each page we need from a report
+PAGE_MARKERS = {
+    "stats": "stat",
+    "overview": "battle overview",
+}
+
+
+def _parse_number(text: str, cast: type) -> float | int:
+    return cast(text.strip().translate(STAT_FORMAT_MAP if cast is float else COUNT_FORMAT_MAP))
+
+
+def _is_stat(text: str) -> bool:
+    try:
+        _parse_number(text, float)
+    except ValueError:
+        return False
+    return True
+
+
+def _is_count(text: str) -> bool:
+    try:
+        _parse_number(text, int)
+    except ValueError:
+        return False
+    return True
+
+
+# Both pages are tables of "<left value>  <label>  <right value>" rows. Pages the
+# probe flags are read with recognition only when every label is found.
+PAGE_LAYOUTS = {
+    "stats": LayoutTemplate("battle_report_stats", ("value", "label", "value"), STAT_LABELS, len(STAT_LABELS), _is_stat),
+    "overview": LayoutTemplate("battle_report_overview", ("value", "label", "value"), OUTCOME_LABELS, len(OUTCOME_LABELS), _is_count),
+}
+
 
 def parse_battle_report(
     images_b64: list[str],
     ocr_engine: str = "rapidocr",
     stats_only: bool = True,
+    max_concurrency: int | None = None,
+    probe_pages: bool = True,
 ) -> tuple[dict[str, dict[str, list[float]]], dict[str, dict[str, int]] | None]:
-    """Parses battle report from base64 images.
+    """Parses battle report from base64 images."""
+    images = LazyImages.from_b64(images_b64)
+    return parse_battle_report_images(images, ocr_engine, stats_only, max_concurrency, probe_pages)
+
 
-    Performs OCR sequentially and finds the required pages ("stat" and optionally
-    "battle overview"). Stops early when enough data is found.
+def parse_battle_report_images(
+    images: list[Any],
+    ocr_engine: str = "rapidocr",
+    stats_only: bool = True,
+    max_concurrency: int | None = None,
+    probe_pages: bool = True,
+) -> tuple[dict[str, dict[str, list[float]]], dict[str, dict[str, int]] | None]:
+    """Parses battle report from decoded images.
+
+    Finds the required pages ("stat" and optionally "battle overview") in upload
+    order, see `ReportPageSearch`, then merges split boxes and reads the values.
     """
-    images = decode_images_from_b64(images_b64)
+    stats = None
+    outcome = None
+    for event in iter_battle_report(images, ocr_engine, stats_only, max_concurrency, probe_pages):
+        if event["event"] == "stats":
+            stats = event["stats"]
+        elif event["event"] == "outcome":
+            outcome = event["outcome"]
+    return stats, outcome
 
-    found_stats: list[tuple[list[list[float]], str, float]] | None = None
-    found_overview: list[tuple[list[list[float]], str, float]] | None = None
 
-    for idx, img in enumerate(images):
-        if found_stats is not None and (stats_only or found_overview is not None):
-            break
+def iter_battle_report(
+    images: list[Any],
+    ocr_engine: str = "rapidocr",
+    stats_only: bool = True,
+    max_concurrency: int | None = None,
+    probe_pages: bool = True,
+) -> Iterator[dict[str, Any]]:
+    """Parses a battle report, yielding each result as soon as it is ready.
 
-        ocr_res = ocr_image(img, ocr_engine)
-        if found_stats is None:
-            if any(str(t[1]).lower().__contains__("stat") for t in ocr_res):
-                found_stats = ocr_res
-        if not stats_only and found_overview is None:
-            if any(str(t[1]).lower().__contains__("battle overview") for t in ocr_res):
-                found_overview = ocr_res
+    Yields dicts with an "event" key, in the order they happen:
+    - "page_classified": a wanted page was found ("index", "page" of "stats"/"overview")
+    - "stats": the stats page was parsed ("stats", as returned by `read_stats`)
+    - "outcome": the overview page was parsed ("outcome", as returned by `read_outcome`)
+    - "done": the search finished ("full_ocr_calls", "full_ocr_skipped", and
+      "duplicate_pages", the skipped pages that repeated earlier ones)
 
-    if found_stats is None:
+    Raises ValueError when a required page is missing, after yielding what was found.
+    """
+    search = ReportPageSearch(images, ocr_engine, stats_only, max_concurrency, probe_pages)
+    for page, idx, ocr_res in search:
+        yield {"event": "page_classified", "index": idx, "page": page}
+        with timed("merge_boxes"):
+            merged = handle_split_boxes(ocr_res)
+        if page == "stats":
+            with timed("parse"):
+                stats = read_stats(merged)
+            yield {"event": "stats", "stats": stats}
+        else:
+            with timed("parse"):
+                outcome = read_outcome(merged)
+            yield {"event": "outcome", "outcome": outcome}
+
+    logger.info(
+        "battle report page search: %d images, %d full-page OCR calls, %d skipped (%d duplicates)",
+        len(images), search.full_ocr_calls, search.full_ocr_skipped, search.duplicate_pages,
+    )
+    IMAGES_PER_REQUEST.labels("battle_report").observe(len(images))
+    PAGES_OCR.labels("battle_report", "ocr").observe(search.full_ocr_calls)
+    PAGES_OCR.labels("battle_report", "skipped").observe(search.full_ocr_skipped)
+    if search.found["stats"] is None:
         raise ValueError("stat page not found.")
+    if not stats_only and search.found["overview"] is None:
+        raise ValueError("battle overview page not found.")
+    yield {
+        "event": "done",
+        "full_ocr_calls": search.full_ocr_calls,
+        "full_ocr_skipped": search.full_ocr_skipped,
+        "duplicate_pages": search.duplicate_pages,
+    }
 
-    stats_text = handle_split_boxes(found_stats)
-    stats = read_stats(stats_text)
 
-    outcome = None
-    if not stats_only:
-        if found_overview is None:
-            raise ValueError("battle overview page not found.")
-        overview_text = handle_split_boxes(found_overview)
-        outcome = read_outcome(overview_text)
+def classify_page(ocr_res: list[tuple[list[list[float]], str, float]]) -> set[str]:
+    """Returns which of the PAGE_MARKERS ("stats", "overview") appear in the OCR text."""
+    found = set()
+    for t in ocr_res:
+        text = str(t[1]).lower()
+        for page, marker in PAGE_MARKERS.items():
+            if text.__contains__(marker):
+                found.add(page)
+    return found
+
+
+class ReportPageSearch:
+    """Finds the first stats page (and overview page unless `stats_only`) in `images`.
+
+    Iterating yields `(page, index, ocr_result)` for each wanted page as soon as it
+    is found, with `page` being "stats" or "overview".
+
+    With `probe_pages`, every page is first classified from a cheap OCR of its
+    header strip (see `ocr.ocr_header_strip`) and only pages whose strip shows a
+    wanted marker get a full-page OCR, which skips text detection when the page
+    matches its `PAGE_LAYOUTS` template. If a page is still missing afterwards (its
+    marker sat below the strip), the remaining pages are fully OCR'd in order.
+    Pages repeating an earlier page (see `dedup.PageDeduper`) are neither probed
+    nor OCR'd. Stops early and cancels outstanding OCR once every wanted page is found.
+    """
+
+    def __init__(
+        self,
+        images: list[Any],
+        ocr_engine: str = "rapidocr",
+        stats_only: bool = True,
+        max_concurrency: int | None = None,
+        probe_pages: bool = True,
+    ):
+        self.images = images
+        self.ocr_engine = ocr_engine
+        self.wanted = {"stats"} if stats_only else {"stats", "overview"}
+        self.max_concurrency = request_concurrency(images, max_concurrency)
+        self.probe_pages = probe_pages
+        self.found: dict[str, Any] = {"stats": None, "overview": None}
+        self.full_ocr_calls = 0
+        self.dedup = PageDeduper("battle_report")
+
+    @property
+    def full_ocr_skipped(self) -> int:
+        return len(self.images) - self.full_ocr_calls
+
+    @property
+    def duplicate_pages(self) -> int:
+        return len(self.dedup.skipped)
+
+    @property
+    def complete(self) -> bool:
+        return all(self.found[page] is not None for page in self.wanted)
+
+    def _record(self, idx: int, ocr_res: list[tuple[list[list[float]], str, float]]) -> list[tuple[str, int, Any]]:
+        self.full_ocr_calls += 1
+        new_pages = []
+        for page in sorted(classify_page(ocr_res) & self.wanted, reverse=True):
+            if self.found[page] is None:
+                self.found[page] = ocr_res
+                new_pages.append((page, idx, ocr_res))
+        return new_pages
+
+    def __iter__(self) -> Iterator[tuple[str, int, Any]]:
+        full_ocr_done: set[int] = set()
+        if self.probe_pages:
+            # Probed pages are kept until their probe is read, so a flagged page is
+            # OCR'd without decoding it again
+            in_flight: dict[int, Any] = {}
+
+            def probed_pages() -> Iterator[Any]:
+                for n, img in enumerate(self.dedup.filter(self.images)):
+                    in_flight[n] = img
+                    yield img
+
+            probes = ocr_pool.imap(ocr_header_strip, probed_pages(), self.ocr_engine, max_concurrency=self.max_concurrency)
+            with closing(probes):
+                for n, strip_res in enumerate(probes):
+                    idx = self.dedup.kept[n]
+                    img = in_flight.pop(n)
+                    missing = {page for page in self.wanted if self.found[page] is None}
+                    flagged = classify_page(strip_res) & missing
+                    if not flagged:
+                        continue
+                    full_ocr_done.add(idx)
+                    layouts = tuple(PAGE_LAYOUTS[page] for page in sorted(flagged))
+                    yield from self._record(idx, ocr_pool.submit(ocr_page, img, self.ocr_engine, layouts).result())
+                    if self.complete:
+                        return
+
+            # Every page went through the deduper; duplicates are not worth a full OCR either
+            remaining = [idx for idx in self.dedup.kept if idx not in full_ocr_done]
+            ocr_results = ocr_images_iter((self.images[idx] for idx in remaining), self.ocr_engine, self.max_concurrency)
+        else:
+            remaining = self.dedup.kept  # filled in as the pages are deduplicated
+            ocr_results = ocr_images_iter(self.images, self.ocr_engine, self.max_concurrency, dedup=self.dedup)
+        with closing(ocr_results):
+            for n, ocr_res in enumerate(ocr_results):
+                yield from self._record(remaining[n], ocr_res)
+                if self.complete:
+                    return
+
+
+def find_report_pages(
+    images: list[Any],
+    ocr_engine: str = "rapidocr",
+    stats_only: bool = True,
+    max_concurrency: int | None = None,
+    probe_pages: bool = True,
+) -> dict[str, Any]:
+    """Runs a `ReportPageSearch` to completion.
+
+    Returns a dict with the full OCR results under "stats" and "overview" (None
+    when not found), plus "full_ocr_calls", "full_ocr_skipped" and
+    "duplicate_pages" counters.
+    """
+    search = ReportPageSearch(images, ocr_engine, stats_only, max_concurrency, probe_pages)
+    for _ in search:
+        pass
+    return {
+        **search.found,
+        "full_ocr_calls": search.full_ocr_calls,
+        "full_ocr_skipped": search.full_ocr_skipped,
+        "duplicate_pages": search.duplicate_pages,
+    }
 
-    return stats, outcome
 
 def get_battle_report_stats(images_text: list[list[Any]]) -> dict[str, dict[str, list[float]]]:
     img_idx, stats_image_text = str_in_image_from_images_list(images_text, "stat")
-    stats_image_text = handle_split_boxes(stats_image_text)
+    with timed("merge_boxes"):
+        stats_image_text = handle_split_boxes(stats_image_text)
     stats = read_stats(stats_image_text)
     return stats
 def get_battle_report_troops_outcome(images_text: list[list[Any]]) -> dict[str, dict[str, list[float]]]:
     img_idx, troops_outcome_text = str_in_image_from_images_list(images_text, "Battle Overview")
-    troops_outcome_text = handle_split_boxes(troops_outcome_text)
+    with timed("merge_boxes"):
+        troops_outcome_text = handle_split_boxes(troops_outcome_text)
     outcome = read_outcome(troops_outcome_text)
     return outcome
 
@@ -79,6 +328,12 @@ def str_in_image_from_images_list(text_in_images: list[list[str]], text_to_find:
     raise ValueError(f"{text_to_find} page not found.")
 
 
+def _read_number(ocr_entry, cast):
+    """Reads the number in an OCR entry's text: a stat with `cast` float (see
+    STAT_FORMAT_MAP), a troop count with `cast` int (see COUNT_FORMAT_MAP)."""
+    return _parse_number(str(ocr_entry[1]), cast)
+
+
 def read_stats(text_in_image: list[str]) -> dict:
     """
     Reads the stats from the text in the image and returns a dictionary with the stats.
@@ -95,47 +350,16 @@ def read_stats(text_in_image: list[str]) -> dict:
             "marksman": [0.0, 0.0, 0.0, 0.0]
         }
     }
-    
+
     for i, text in enumerate(text_in_image):
         if isinstance(text, tuple):
             text = text[1]
-        text = str(text).strip().lower()
-        if text.__contains__("infantry attack"):
-            stats_dict["left"]["infantry"][0] = float(str(text_in_image[i-1][1]).strip().replace("%", "").replace("+", ""))
-            stats_dict["right"]["infantry"][0] = float(str(text_in_image[i+1][1]).strip().replace("%", "").replace("+", ""))
-        elif text.__contains__("infantry defense"):
-            stats_dict["left"]["infantry"][1] = float(str(text_in_image[i-1][1]).strip().replace("%", "").replace("+", ""))
-            stats_dict["right"]["infantry"][1] = float(str(text_in_image[i+1][1]).strip().replace("%", "").replace("+", ""))
-        elif text.__contains__("infantry lethality"):
-            stats_dict["left"]["infantry"][2] = float(str(text_in_image[i-1][1]).strip().replace("%", "").replace("+", ""))
-            stats_dict["right"]["infantry"][2] = float(str(text_in_image[i+1][1]).strip().replace("%", "").replace("+", ""))
-        elif text.__contains__("infantry health"):
-            stats_dict["left"]["infantry"][3] = float(str(text_in_image[i-1][1]).strip().replace("%", "").replace("+", ""))
-            stats_dict["right"]["infantry"][3] = float(str(text_in_image[i+1][1]).strip().replace("%", "").replace("+", ""))
-        elif text.__contains__("lancer attack"):
-            stats_dict["left"]["lancer"][0] = float(str(text_in_image[i-1][1]).strip().replace("%", "").replace("+", ""))
-            stats_dict["right"]["lancer"][0] = float(str(text_in_image[i+1][1]).strip().replace("%", "").replace("+", ""))
-        elif text.__contains__("lancer defense"):
-            stats_dict["left"]["lancer"][1] = float(str(text_in_image[i-1][1]).strip().replace("%", "").replace("+", ""))
-            stats_dict["right"]["lancer"][1] = float(str(text_in_image[i+1][1]).strip().replace("%", "").replace("+", ""))
-        elif text.__contains__("lancer lethality"):
-            stats_dict["left"]["lancer"][2] = float(str(text_in_image[i-1][1]).strip().replace("%", "").replace("+", ""))
-            stats_dict["right"]["lancer"][2] = float(str(text_in_image[i+1][1]).strip().replace("%", "").replace("+", ""))
-        elif text.__contains__("lancer health"):
-            stats_dict["left"]["lancer"][3] = float(str(text_in_image[i-1][1]).strip().replace("%", "").replace("+", ""))
-            stats_dict["right"]["lancer"][3] = float(str(text_in_image[i+1][1]).strip().replace("%", "").replace("+", ""))
-        elif text.__contains__("marksman attack"):
-            stats_dict["left"]["marksman"][0] = float(str(text_in_image[i-1][1]).strip().replace("%", "").replace("+", ""))
-            stats_dict["right"]["marksman"][0] = float(str(text_in_image[i+1][1]).strip().replace("%", "").replace("+", ""))
-        elif text.__contains__("marksman defense"):
-            stats_dict["left"]["marksman"][1] = float(str(text_in_image[i-1][1]).strip().replace("%", "").replace("+", ""))
-            stats_dict["right"]["marksman"][1] = float(str(text_in_image[i+1][1]).strip().replace("%", "").replace("+", ""))
-        elif text.__contains__("marksman lethality"):
-            stats_dict["left"]["marksman"][2] = float(str(text_in_image[i-1][1]).strip().replace("%", "").replace("+", ""))
-            stats_dict["right"]["marksman"][2] = float(str(text_in_image[i+1][1]).strip().replace("%", "").replace("+", ""))
-        elif text.__contains__("marksman health"):
-            stats_dict["left"]["marksman"][3] = float(str(text_in_image[i-1][1]).strip().replace("%", "").replace("+", ""))
-            stats_dict["right"]["marksman"][3] = float(str(text_in_image[i+1][1]).strip().replace("%", "").replace("+", ""))
+        match = STAT_LABEL_PATTERN.search(str(text).strip().lower())
+        if match is None:
+            continue
+        troop, stat_idx = STAT_LABELS[match.group()]
+        stats_dict["left"][troop][stat_idx] = _read_number(text_in_image[i-1], float)
+        stats_dict["right"][troop][stat_idx] = _read_number(text_in_image[i+1], float)
 
     return stats_dict
 
@@ -160,33 +384,14 @@ def read_outcome(text_in_image: list[str]) -> dict:
             "survivors": 0
         }
     }
-    format_map = str.maketrans(
-        {
-            "%": "",
-            "+": "",
-            ",": "",
-            "o": "0",
-            "O": "0",
-        }
-    )
     for i, text in enumerate(text_in_image):
         if isinstance(text, tuple):
             text = text[1]
-        text = str(text).strip().lower()
-        if text.__contains__("troops"):
-            troops_count_dict["left"]["initial_troops"] = int(str(text_in_image[i-1][1]).strip().translate(format_map))
-            troops_count_dict["right"]["initial_troops"] = int(str(text_in_image[i+1][1]).strip().translate(format_map))
-        elif text.__contains__("losses"):
-            troops_count_dict["left"]["losses"] = int(str(text_in_image[i-1][1]).strip().translate(format_map))
-            troops_count_dict["right"]["losses"] = int(str(text_in_image[i+1][1]).strip().translate(format_map))
-        elif text.__contains__("injured") and not text.__contains__("lightly"):
-            troops_count_dict["left"]["injured"] = int(str(text_in_image[i-1][1]).strip().translate(format_map))
-            troops_count_dict["right"]["injured"] = int(str(text_in_image[i+1][1]).strip().translate(format_map))
-        elif text.__contains__("lightly injured"):
-            troops_count_dict["left"]["lightly_injured"] = int(str(text_in_image[i-1][1]).strip().translate(format_map))
-            troops_count_dict["right"]["lightly_injured"] = int(str(text_in_image[i+1][1]).strip().translate(format_map))
-        elif text.__contains__("survivors"):
-            troops_count_dict["left"]["survivors"] = int(str(text_in_image[i-1][1]).strip().translate(format_map))
-            troops_count_dict["right"]["survivors"] = int(str(text_in_image[i+1][1]).strip().translate(format_map))
+        match = OUTCOME_LABEL_PATTERN.search(str(text).strip().lower())
+        if match is None:
+            continue
+        field = OUTCOME_LABELS[match.group()]
+        troops_count_dict["left"][field] = _read_number(text_in_image[i-1], int)
+        troops_count_dict["right"][field] = _read_number(text_in_image[i+1], int)
 
     return troops_count_dict
@@ -1,7 +1,14 @@
-from typing import Any
+from contextlib import closing
+from typing import IO, Any, Iterable
 
-from utils import handle_split_boxes
-from ocr import ocr_images_b64
+from utils import handle_split_boxes, TextIndex
+from ocr import LazyImages, ocr_images_iter, request_concurrency
+from layout import LayoutTemplate
+from dedup import PageDeduper
+from stitch import STITCH_PAGES, stitch_pages
+from timings import timed
+from metrics import IMAGES_PER_REQUEST, PAGES_OCR, VIDEO_FRAMES
+from video import keyframes, read_video_frames
 
 KEYS = ["Troops Attack", "Troops Defense","Troops Lethality", "Troops Health",
     "Infantry Attack", "Infantry Defense", "Infantry Lethality", "Infantry Health",
@@ -9,37 +16,194 @@ KEYS = ["Troops Attack", "Troops Defense","Troops Lethality", "Troops Health",
     "Marksman Attack", "Marksman Defense", "Marksman Lethality", "Marksman Health"
 ]    
 
-def get_bonus_overview_stats(images_text: list[list[Any]]) -> dict[str, dict[str, list[float]]]:
-    stats = [convert_to_stats(result) for result in images_text]
+# Minimum OCR confidence for a value to count towards early-exit coverage
+MIN_VALUE_CONFIDENCE = 0.9
+
+# The rows of KEYS in the order the game lists them
+BONUS_OVERVIEW_ROWS = [
+    "troops attack", "troops defense", "troops lethality", "troops health",
+    "infantry attack", "infantry defense", "infantry health", "infantry lethality",
+    "lancer attack", "lancer defense", "lancer health", "lancer lethality",
+    "marksman attack", "marksman defense", "marksman health", "marksman lethality",
+]
+
+
+def _is_percentage(text: str) -> bool:
+    return text.replace("%", "", 1).replace(".", "", 1).isdigit()
+
+
+# Rows of "<label>  <value>%"; pages that do not match are fully OCR'd. A page shows
+# any run of consecutive rows (other stats such as healing speed sit around them), so
+# the check is that none in between is missing and that no value there lacks its label.
+BONUS_OVERVIEW_LAYOUT = LayoutTemplate(
+    "bonus_overview",
+    ("label", "value"),
+    BONUS_OVERVIEW_ROWS,
+    is_value=_is_percentage,
+    ordered=True,
+    strict_values=True,
+)
+
+def get_bonus_overview_stats(images_text: list[list[Any]], fuzzy_keys: bool = False) -> dict[str, dict[str, list[float]]]:
+    stats = [convert_to_stats(result, fuzzy_keys) for result in images_text]
     merged_stats = merge_stats(stats)
     return merged_stats
 
 
-def parse_bonus_overview(images_b64: list[str], ocr_engine: str = "rapidocr") -> dict[str, dict[str, list[float]]]:
+def parse_bonus_overview(
+    images_b64: list[str],
+    ocr_engine: str = "rapidocr",
+    fuzzy_keys: bool = False,
+) -> dict[str, dict[str, list[float]]]:
     """Decode, OCR, and parse bonus overview images from base64 payloads."""
-    images_text = ocr_images_b64(images_b64, ocr_engine)
-    return get_bonus_overview_stats(images_text)
+    images_text = _ocr_pages(LazyImages.from_b64(images_b64), ocr_engine)
+    _observe_request(len(images_b64), len(images_text))
+    return get_bonus_overview_stats(images_text, fuzzy_keys)
+
+
+def parse_bonus_overview_images(
+    images: list[Any],
+    ocr_engine: str = "rapidocr",
+    fuzzy_keys: bool = False,
+) -> dict[str, dict[str, list[float]]]:
+    """OCR and parse already decoded bonus overview images."""
+    images_text = _ocr_pages(images, ocr_engine)
+    _observe_request(len(images), len(images_text))
+    return get_bonus_overview_stats(images_text, fuzzy_keys)
+
+
+def parse_bonus_overview_until_complete(
+    images: list[Any],
+    ocr_engine: str = "rapidocr",
+    fuzzy_keys: bool = False,
+    min_confidence: float = MIN_VALUE_CONFIDENCE,
+) -> tuple[dict[str, list[float]], list[int]]:
+    """OCR and parse bonus overview images in order, stopping once every key is read.
+
+    A key counts as read once some image has a numeric value for it with OCR
+    confidence of at least `min_confidence`. The remaining images are not OCR'd
+    (any already in flight on the pool are discarded).
+
+    Returns the merged stats and the indices of the skipped images: those
+    repeating earlier ones and those after every key was read.
+    """
+    stats = []
+    filled: set[str] = set()
+    dedup = _deduper()
+    with closing(ocr_images_iter(images, ocr_engine, layouts=(BONUS_OVERVIEW_LAYOUT,), dedup=dedup)) as ocr_results:
+        for ocr_res in ocr_results:
+            image_stats, image_filled = convert_to_stats_with_coverage(ocr_res, fuzzy_keys, min_confidence)
+            stats.append(image_stats)
+            filled |= image_filled
+            if len(filled) == len(KEYS):
+                break
+    # Pages already handed to the pool when the loop stopped are in `kept` too
+    read = set(dedup.kept[:len(stats)])
+    skipped = [idx for idx in range(len(images)) if idx not in read]
+    _observe_request(len(images), len(stats))
+    return merge_stats(stats), skipped
+
+
+def parse_bonus_overview_video(
+    video: IO[bytes],
+    ocr_engine: str = "rapidocr",
+    fuzzy_keys: bool = False,
+) -> dict[str, dict[str, list[float]]]:
+    """OCR and parse a screen recording of the bonus overview being scrolled.
+
+    Only keyframes showing rows no earlier keyframe showed are OCR'd (see
+    `video.keyframes`), each cropped to its new rows.
+    """
+    dedup = _deduper()
+    images_text = _ocr_pages(keyframes(read_video_frames(video)), ocr_engine, dedup)
+    VIDEO_FRAMES.labels("keyframe").inc(len(dedup.kept))
+    # The keyframes play the part of uploaded images
+    _observe_request(len(dedup.kept) + len(dedup.skipped), len(images_text))
+    return get_bonus_overview_stats(images_text, fuzzy_keys)
+
+
+def _ocr_pages(
+    images: Iterable[Any],
+    ocr_engine: str,
+    dedup: PageDeduper | None = None,
+) -> list[list[tuple[list[list[float]], str, float]]]:
+    """OCRs bonus overview pages, reading the rows they share only once.
 
-def convert_to_stats(raw_ocr_output: list[str]) -> dict[str, list[float]]:
+    Repeated pages are dropped (see `dedup.PageDeduper`), and with `STITCH_PAGES`
+    the distinct rows of all pages are stitched onto one canvas (see
+    `stitch.stitch_pages`), so overlapping screenshots cost one OCR pass and
+    each stat is read from a single row.
+    """
+    max_concurrency = request_concurrency(images)
+    pages = (dedup or _deduper()).filter(images)
+    if STITCH_PAGES:
+        pages = stitch_pages(pages)
+    return list(ocr_images_iter(pages, ocr_engine, max_concurrency, layouts=(BONUS_OVERVIEW_LAYOUT,)))
+
+
+def _deduper() -> PageDeduper:
+    # Overlapping scroll positions only add their new rows: stats are merged by
+    # taking the highest value, and a label missing from a page reads as 0
+    return PageDeduper("bonus_overview", crop_scrolled=True)
+
+
+def _observe_request(image_count: int, ocr_count: int) -> None:
+    IMAGES_PER_REQUEST.labels("bonus_overview").observe(image_count)
+    PAGES_OCR.labels("bonus_overview", "ocr").observe(ocr_count)
+    PAGES_OCR.labels("bonus_overview", "skipped").observe(image_count - ocr_count)
+
+
+def convert_to_stats(raw_ocr_output: list[str], fuzzy_keys: bool = False) -> dict[str, list[float]]:
     """
     Converts raw OCR output into a structured stats dictionary.
     
     Args:
         raw_ocr_output (list[str]): List of strings from OCR output.
+        fuzzy_keys (bool): Whether to match stat labels misread by one character.
         
     Returns:
         dict[str, list[float]]: Dictionary with structured stats.
     """
-    merged_results = handle_split_boxes(raw_ocr_output)
-    extracted = extract_stats(merged_results, KEYS)
-    for key, value in extracted.items():
+    return convert_to_stats_with_coverage(raw_ocr_output, fuzzy_keys)[0]
+
+
+def convert_to_stats_with_coverage(
+    raw_ocr_output: list[str],
+    fuzzy_keys: bool = False,
+    min_confidence: float = MIN_VALUE_CONFIDENCE,
+) -> tuple[dict[str, list[float]], set[str]]:
+    """
+    Like `convert_to_stats`, but also returns the keys whose value was read as a
+    number with OCR confidence of at least `min_confidence`.
+    """
+    with timed("merge_boxes"):
+        merged_results = handle_split_boxes(raw_ocr_output)
+    with timed("parse"):
+        return _stats_from_merged(merged_results, fuzzy_keys, min_confidence)
+
+
+def _stats_from_merged(
+    merged_results: list[Any],
+    fuzzy_keys: bool,
+    min_confidence: float,
+) -> tuple[dict[str, list[float]], set[str]]:
+    value_entries = match_stat_entries(merged_results, KEYS, fuzzy_keys)
+    extracted = {}
+    filled = set()
+    for key, entry in value_entries.items():
+        if entry is None:
+            extracted[key] = 0.0  # Key not found in OCR results
+            continue
+        value = entry["text"]
         # print(f"Extracted {key}: {value}")
         if isinstance(value, str) and value.replace("%", "", 1).replace('.', '', 1).isdigit():
             extracted[key] = float(value.replace("%", "", 1))
-        elif isinstance(value, str):
+            if entry["prob"] >= min_confidence:
+                filled.add(key)
+        else:
             extracted[key] = 0.0  # Default to 0.0 if the value is not a number
 
-    return format_stats(extracted)
+    return format_stats(extracted), filled
 
 
 def format_stats(kv_dict: dict) -> dict[str, list[float]]:
@@ -68,37 +232,39 @@ def format_stats(kv_dict: dict) -> dict[str, list[float]]:
     stats["marksman"][3] = kv_dict["Marksman Health"]
     return stats
 
-def extract_stats(results, keys):
+def extract_stats(results, keys, fuzzy_keys=False):
     """
     Given OCR results and a list of keys, match each key to its value by finding the closest y-axis value.
     Returns a dictionary of key-value pairs.
     """
-    # Prepare a list of (avg_y, text, bbox) for all results
-    ocr_entries = []
-    for bbox, text, prob in results:
-        y_coords = [pt[1] for pt in bbox]
-        avg_y = sum(y_coords) / len(y_coords)
-        ocr_entries.append({'avg_y': avg_y, 'text': text, 'bbox': bbox})
-
-    kv_dict = {}
+    return {
+        key: entry["text"] if entry is not None else 0.0  # Key not found in OCR results
+        for key, entry in match_stat_entries(results, keys, fuzzy_keys).items()
+    }
+
+def match_stat_entries(results, keys, fuzzy_keys=False):
+    """
+    Matches each key to the `TextIndex` entry of its value, the closest entry on the y-axis.
+    Keys that are not found map to None.
+
+    Uses a `TextIndex`, so matching k keys costs O((n + k) log n) rather than O(k * n).
+    With `fuzzy_keys`, labels misread by one character still match.
+    """
+    index = TextIndex(results)
+
+    entries = {}
     for key in keys:
-        # Find the OCR entry that matches the key (case-insensitive)
-        key_entry = next((entry for entry in ocr_entries if entry['text'].strip().lower() == key.strip().lower()), None)
+        key_entry = index.find(key, fuzzy=fuzzy_keys)
         if key_entry is None:
-            kv_dict[key] = 0.0  # Key not found in OCR results
-            continue  # Key not found in OCR results
+            entries[key] = None
+            continue
 
-        key_y = key_entry['avg_y']
         # Find the closest entry (excluding the key itself) by y-axis
-        value_entry = min(
-            (entry for entry in ocr_entries if entry['text'] != key_entry['text']),
-            key=lambda entry: abs(entry['avg_y'] - key_y),
-            default=None
-        )
+        value_entry = index.nearest_by_y(key_entry["avg_y"], exclude_text=key_entry["text"])
         if value_entry:
-            kv_dict[key] = value_entry['text']
+            entries[key] = value_entry
 
-    return kv_dict
+    return entries
 
 def merge_stats(stats: list[dict[str, list[float]]]) -> dict[str, list[float]]:
     """
@@ -0,0 +1,157 @@
+import os
+from typing import Any, Iterable, Iterator
+
+import cv2
+import numpy as np
+
+from metrics import DUPLICATE_PAGES
+from timings import timed
+
+# Uploads often repeat content: the same battle report page captured twice, or bonus
+# overview screenshots at nearly the same scroll position. Each page is compared with
+# the pages before it on a small signature before OCR; repeats are skipped, and
+# scrolled pages can be cropped to the rows they add.
+PAGE_DEDUP = os.environ.get("PAGE_DEDUP", "1") == "1"
+# Pages whose difference hashes differ in more bits are never compared further
+DEDUP_HASH_DISTANCE = int(os.environ.get("DEDUP_HASH_DISTANCE", 8))
+
+# Signatures keep every pixel row but average the columns into this many bins, so a
+# vertical scroll by whole pixels shifts them exactly
+SIGNATURE_BINS = 32
+# Columns at each edge left out of signatures (scroll bars, animated borders)
+SIGNATURE_MARGIN = 0.05
+# Largest difference (0-255) of any bin for two signature rows to count as the same;
+# a changed digit moves its bin well past this
+ROW_TOLERANCE = 8.0
+# Rows whose bins span less than this are plain background and prove nothing
+MIN_ROW_CONTRAST = 24.0
+# A scroll offset is only trusted when this many text rows line up
+MIN_OVERLAP_ROWS = 16
+# Rows kept above the new region of a cropped page, as a fraction of the width, so
+# a line cut by the previous page's edge is read whole
+CROP_MARGIN = 0.06
+
+
+class PageSignature:
+    """What `PageDeduper` compares: a 64-bit difference hash of the whole page and a
+    per-row signature (see `SIGNATURE_BINS`)."""
+
+    def __init__(self, img: Any):
+        gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        height, width = gray.shape
+        small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+        self.hash = int.from_bytes(np.packbits(small[:, 1:] > small[:, :-1]).tobytes(), "big")
+        margin = int(width * SIGNATURE_MARGIN)
+        inner = gray[:, margin:width - margin]
+        self.rows = cv2.resize(inner, (SIGNATURE_BINS, height), interpolation=cv2.INTER_AREA).astype(np.float32)
+        self.width = width
+
+    @property
+    def height(self) -> int:
+        return self.rows.shape[0]
+
+
+def same_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    return np.abs(a - b).max(axis=1) <= ROW_TOLERANCE
+
+
+def is_duplicate(first: PageSignature, second: PageSignature) -> bool:
+    """Whether the pages show the same content, at any resolution of the same aspect."""
+    if bin(first.hash ^ second.hash).count("1") > DEDUP_HASH_DISTANCE:
+        return False
+    if abs(first.height / first.width - second.height / second.width) > 0.01:
+        return False
+    a, b = first.rows, second.rows
+    if a.shape != b.shape:
+        # Compare at the smaller resolution
+        if a.shape[0] < b.shape[0]:
+            a, b = b, a
+        a = cv2.resize(a, (SIGNATURE_BINS, b.shape[0]), interpolation=cv2.INTER_AREA)
+    return bool(same_rows(a, b).all())
+
+
+def find_scroll(previous: PageSignature, page: PageSignature) -> tuple[int, int, int] | None:
+    """Finds how far `page` is scrolled down from `previous`, for same-size screenshots.
+
+    Rows that are identical in both pages are the fixed frame (title bar,
+    borders); the rows between are the scrolled view. Returns `(top, bottom,
+    offset)`: the scrolled view spans rows [top, bottom) of both pages, and row
+    `y` of `page` shows what row `y + offset` of `previous` showed, so `page`'s
+    new content starts at row `bottom - offset`. Returns None when the pages
+    differ in size or their content does not line up at any offset.
+    """
+    if previous.rows.shape != page.rows.shape:
+        return None
+    moving = np.flatnonzero(~same_rows(previous.rows, page.rows))
+    if len(moving) == 0:
+        return None
+    top, bottom = int(moving[0]), int(moving[-1]) + 1
+    prev_rows, rows = previous.rows[top:bottom], page.rows[top:bottom]
+    contrast = np.ptp(rows, axis=1)
+    textured = np.flatnonzero(contrast >= MIN_ROW_CONTRAST)
+    if len(textured) < MIN_OVERLAP_ROWS:
+        return None
+    # Offsets at which the first text row of the view has a twin in the previous page
+    anchor = textured[0]
+    matches = np.flatnonzero(np.abs(prev_rows - rows[anchor]).max(axis=1) <= ROW_TOLERANCE)
+    for offset in matches[matches > anchor] - anchor:
+        overlap = textured[textured < len(rows) - offset]
+        if len(overlap) < MIN_OVERLAP_ROWS:
+            break
+        if same_rows(prev_rows[overlap + offset], rows[overlap]).all():
+            # The smallest offset is the one with the most rows lining up
+            return top, bottom, int(offset)
+    return None
+
+
+class PageDeduper:
+    """Skips pages of one request that repeat earlier ones, before they are OCR'd.
+
+    `filter` yields the pages worth OCRing, in order. A page is skipped when it
+    shows the same content as any earlier page (see `is_duplicate`). With
+    `crop_scrolled`, a page scrolled down from the previous one (same screen size)
+    is cropped to the rows it adds, and skipped if it adds none. `kept` holds the
+    indices of the yielded pages (`cropped` those of them that were cropped), and
+    `skipped` the others.
+    """
+
+    def __init__(self, parser: str, crop_scrolled: bool = False, enabled: bool = PAGE_DEDUP):
+        self.parser = parser
+        self.crop_scrolled = crop_scrolled
+        self.enabled = enabled
+        self.kept: list[int] = []
+        self.skipped: list[int] = []
+        self.cropped: list[int] = []
+        self._signatures: list[PageSignature] = []
+
+    def filter(self, images: Iterable[Any]) -> Iterator[Any]:
+        for idx, img in enumerate(images):
+            page = self.check(img) if self.enabled else img
+            if page is None:
+                self.skipped.append(idx)
+                DUPLICATE_PAGES.labels(self.parser, "skipped").inc()
+                continue
+            if page is not img:
+                self.cropped.append(idx)
+                DUPLICATE_PAGES.labels(self.parser, "cropped").inc()
+            self.kept.append(idx)
+            yield page
+
+    def check(self, img: Any) -> Any | None:
+        """The part of `img` worth OCRing, or None when it adds nothing."""
+        with timed("dedup"):
+            signature = PageSignature(img)
+            previous = self._signatures[-1] if self._signatures else None
+            self._signatures.append(signature)
+            if any(is_duplicate(earlier, signature) for earlier in self._signatures[:-1]):
+                return None
+            if not self.crop_scrolled or previous is None:
+                return img
+            scroll = find_scroll(previous, signature)
+        if scroll is None:
+            return img
+        top, bottom, offset = scroll
+        new_top = bottom - offset
+        if not (np.ptp(signature.rows[new_top:bottom], axis=1) >= MIN_ROW_CONTRAST).any():
+            return None  # only background scrolled into view
+        return img[max(0, new_top - int(signature.width * CROP_MARGIN)):]
@@ -0,0 +1,168 @@
+import importlib.util
+import json
+import os
+import shutil
+import threading
+from abc import ABC, abstractmethod
+from typing import Any
+
+OCRResult = list[tuple[list[list[float]], str, float]]
+
+# Measured by benchmarks/engine_profiles.py; engines without a profile are never
+# picked for "fastest" or "most_accurate", only when asked for by name.
+OCR_ENGINE_PROFILES = os.environ.get(
+    "OCR_ENGINE_PROFILES", os.path.join(os.path.dirname(__file__), "engine_profiles.json")
+)
+ENGINE_ALIASES = ("fastest", "most_accurate")
+# How much quicker per page an engine must be to count as faster when resolving
+# "fastest" / "most_accurate"; closer timings are a tie
+FASTEST_MIN_SPEEDUP = float(os.environ.get("FASTEST_MIN_SPEEDUP", 1.2))
+
+
+class OCREngine(ABC):
+    """An OCR backend returning results as `(bbox, text, confidence)` tuples, with
+    `bbox` the four corners of the text line.
+
+    Models are loaded on first use. `requires` lists the modules (and `binaries`
+    the executables) the engine needs; engines missing any are unavailable.
+    """
+
+    name = ""
+    requires: tuple[str, ...] = ()
+    binaries: tuple[str, ...] = ()
+
+    _available: bool | None = None
+
+    def available(self) -> bool:
+        if self._available is None:
+            self._available = all(importlib.util.find_spec(m) is not None for m in self.requires) and all(
+                shutil.which(binary) is not None for binary in self.binaries
+            )
+        return self._available
+
+    @abstractmethod
+    def read(self, img: Any) -> OCRResult:
+        """OCRs a whole page: detection, then recognition of every text line."""
+
+    def read_strip(self, img: Any) -> OCRResult:
+        """OCRs a header strip while probing battle report pages."""
+        return self.read(img)
+
+    # Whether `recognize` reads crops without running detection on them; layout-template
+    # mode is only used with engines that do
+    recognizes_crops = False
+
+    def recognize(self, crops: list[Any]) -> list[tuple[str, float]]:
+        """Reads `(text, confidence)` from crops of single text lines. By default each
+        crop is `read` as a page and its lines are joined left to right."""
+        texts = []
+        for crop in crops:
+            lines = sorted(self.read(crop), key=lambda line: line[0][0][0])
+            if not lines:
+                texts.append(("", 0.0))
+                continue
+            texts.append((" ".join(text for _, text, _ in lines), min(confidence for _, _, confidence in lines)))
+        return texts
+
+
+class EasyOCREngine(OCREngine):
+    name = "easyocr"
+    requires = ("easyocr",)
+
+    def __init__(self):
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def read(self, img: Any) -> OCRResult:
+        # One reader for the process; its torch model is not safe to call concurrently
+        with self._lock:
+            if self._reader is None:
+                import easyocr
+
+                self._reader = easyocr.Reader(["en"], gpu=False, verbose=False)
+            detections = self._reader.readtext(img)
+        return [
+            ([[float(x), float(y)] for x, y in bbox], text, float(confidence))
+            for bbox, text, confidence in detections
+        ]
+
+
+class TesseractEngine(OCREngine):
+    name = "tesseract"
+    requires = ("pytesseract",)
+    binaries = ("tesseract",)
+
+    def read(self, img: Any) -> OCRResult:
+        import pytesseract
+
+        # Sparse text mode: UI screenshots are labels and numbers, not paragraphs
+        data = pytesseract.image_to_data(img, config="--psm 11", output_type=pytesseract.Output.DICT)
+        lines: dict[tuple[int, int, int], list[int]] = {}
+        for i, text in enumerate(data["text"]):
+            if text.strip() and float(data["conf"][i]) >= 0:
+                lines.setdefault((data["block_num"][i], data["par_num"][i], data["line_num"][i]), []).append(i)
+
+        results = []
+        for words in lines.values():
+            left = min(data["left"][i] for i in words)
+            top = min(data["top"][i] for i in words)
+            right = max(data["left"][i] + data["width"][i] for i in words)
+            bottom = max(data["top"][i] + data["height"][i] for i in words)
+            text = " ".join(data["text"][i] for i in words)
+            confidence = sum(float(data["conf"][i]) for i in words) / len(words) / 100
+            bbox = [[float(left), float(top)], [float(right), float(top)], [float(right), float(bottom)], [float(left), float(bottom)]]
+            results.append((bbox, text, confidence))
+        return results
+
+
+ENGINES: dict[str, OCREngine] = {}
+
+
+def register_engine(engine: OCREngine) -> None:
+    ENGINES[engine.name] = engine
+
+
+def load_profiles(path: str = OCR_ENGINE_PROFILES) -> dict[str, dict[str, float]]:
+    """Engine name -> {"seconds_per_page", "accuracy"}, as written by benchmarks/engine_profiles.py."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except OSError:
+        return {}
+
+
+engine_profiles = load_profiles()
+
+
+def _near_quickest(candidates: list[OCREngine]) -> list[OCREngine]:
+    # Timings within FASTEST_MIN_SPEEDUP of the quickest are run-to-run noise
+    quickest = min(engine_profiles[e.name]["seconds_per_page"] for e in candidates)
+    return [e for e in candidates if engine_profiles[e.name]["seconds_per_page"] <= quickest * FASTEST_MIN_SPEEDUP]
+
+
+def resolve_engine(name: str) -> OCREngine:
+    """Returns the engine called `name`, or the available profiled engine that is
+    the "fastest" or the "most_accurate". Engines within `FASTEST_MIN_SPEEDUP` of
+    the quickest count as equally fast: "fastest" is the most accurate of those,
+    and "most_accurate" breaks accuracy ties only on a clear speed difference.
+    Remaining ties go to the engine registered first."""
+    key = name.strip().lower().replace(" ", "_").replace("-", "_")
+    if key in ENGINES:
+        engine = ENGINES[key]
+        if not engine.available():
+            raise ValueError(f"OCR engine '{name}' is not installed on this server.")
+        return engine
+    if key not in ENGINE_ALIASES:
+        raise ValueError(f"unknown OCR engine '{name}', expected one of: {', '.join([*ENGINES, *ENGINE_ALIASES])}.")
+
+    candidates = [engine for engine in ENGINES.values() if engine.name in engine_profiles and engine.available()]
+    if not candidates:
+        raise ValueError(f"no profiled OCR engine is available for '{name}'.")
+    if key == "fastest":
+        return max(_near_quickest(candidates), key=lambda e: engine_profiles[e.name]["accuracy"])
+    best = max(engine_profiles[e.name]["accuracy"] for e in candidates)
+    return _near_quickest([e for e in candidates if engine_profiles[e.name]["accuracy"] == best])[0]
+
+
+register_engine(EasyOCREngine())
+register_engine(TesseractEngine())
@@ -0,0 +1,106 @@
+import logging
+import os
+import re
+from typing import Any
+
+import cv2
+import numpy as np
+
+# Numeric value cells are read by matching each glyph against templates of the game
+# font (built from the bundled screenshots by benchmarks/build_glyphs.py), which takes
+# microseconds instead of a recognition model call. Cells with any uncertain glyph are
+# left to the OCR engine.
+GLYPH_MATCHING = os.environ.get("GLYPH_MATCHING", "1") == "1"
+GLYPH_TEMPLATES = os.environ.get(
+    "GLYPH_TEMPLATES", os.path.join(os.path.dirname(__file__), "glyph_templates.npz")
+)
+# Minimum normalized correlation with the best template, for every glyph of a cell
+GLYPH_MIN_SCORE = float(os.environ.get("GLYPH_MIN_SCORE", 0.85))
+
+logger = logging.getLogger(__name__)
+
+GLYPHS = "0123456789+-%,."
+# Glyphs are compared at this size; columns keep the cell's full height, so "," and
+# "." are told apart from other glyphs by where they sit
+GLYPH_SIZE = (12, 24)
+# A glyph's width relative to the cell height may differ this much from its template's
+ASPECT_TOLERANCE = 0.35
+# Readings must look like a value the game shows ("+245.3%", "871,171"); anything
+# else (a label that happens to match glyph shapes, "1.2.3") is left to OCR
+NUMBER_PATTERN = re.compile(r"[+-]?(?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d+)?%?")
+
+
+def segment_glyphs(cell: Any) -> list[tuple[np.ndarray, float]]:
+    """Splits a tight crop of one text line into glyphs at blank columns.
+
+    Returns each glyph as a normalized feature vector with its aspect ratio
+    (width / cell height). Touching glyphs come out as one segment, which then
+    matches no template.
+    """
+    gray = cell if cell.ndim == 2 else cv2.cvtColor(cell, cv2.COLOR_BGR2GRAY)
+    if gray.shape[0] < 4 or gray.shape[1] < 2:
+        return []
+    _, ink = cv2.threshold(gray, 0, 1, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    if ink.mean() > 0.5:
+        # Text is the minority; dark text on a light background
+        ink = 1 - ink
+    columns = np.concatenate(([0], ink.any(axis=0).astype(np.int8), [0]))
+    edges = np.flatnonzero(np.diff(columns))
+    height = gray.shape[0]
+    glyphs = []
+    for left, right in zip(edges[::2], edges[1::2]):
+        glyph = cv2.resize(ink[:, left:right].astype(np.float32), GLYPH_SIZE, interpolation=cv2.INTER_AREA)
+        vector = glyph.ravel() - glyph.mean()
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            continue
+        glyphs.append((vector / norm, (right - left) / height))
+    return glyphs
+
+
+class GlyphMatcher:
+    """Nearest-template reader for numeric cells (digits, "+", "-", "%", "," and ".")."""
+
+    def __init__(self, vectors: np.ndarray, labels: np.ndarray, aspects: np.ndarray, min_score: float = GLYPH_MIN_SCORE):
+        self.vectors = vectors.astype(np.float32)
+        self.labels = labels
+        self.aspects = aspects.astype(np.float32)
+        self.min_score = min_score
+
+    @classmethod
+    def load(cls, path: str = GLYPH_TEMPLATES) -> "GlyphMatcher | None":
+        """The matcher for the templates at `path`, or None when there are none or
+        the file is unreadable (cells then all go to OCR)."""
+        try:
+            with np.load(path) as data:
+                return cls(data["vectors"], data["labels"], data["aspects"])
+        except FileNotFoundError:
+            return None
+        except (OSError, KeyError, ValueError):
+            logger.warning("ignoring unreadable glyph templates %s", path, exc_info=True)
+            return None
+
+    def read(self, cell: Any) -> tuple[str, float] | None:
+        """Reads `(text, confidence)` from a tight crop of a value cell, or None when
+        a glyph matches no template well enough or the text is not a number (see
+        `NUMBER_PATTERN`). Confidence is the lowest glyph score."""
+        glyphs = segment_glyphs(cell)
+        if not glyphs:
+            return None
+        vectors = np.stack([vector for vector, _ in glyphs])
+        aspects = np.array([aspect for _, aspect in glyphs], np.float32)
+        scores = vectors @ self.vectors.T
+        # Templates of a very different width never match (e.g. "1" and "-")
+        ratio = aspects[:, None] / self.aspects[None, :]
+        scores[np.abs(ratio - 1) > ASPECT_TOLERANCE] = -1.0
+        best = scores.argmax(axis=1)
+        best_scores = scores[np.arange(len(glyphs)), best]
+        if best_scores.min() < self.min_score:
+            return None
+        text = "".join(self.labels[best])
+        if not NUMBER_PATTERN.fullmatch(text):
+            return None
+        return text, float(best_scores.min())
+
+
+glyph_matcher = GlyphMatcher.load() if GLYPH_MATCHING else None
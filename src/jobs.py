@@ -0,0 +1,303 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+from metrics import JOBS_FINISHED, JOBS_SUBMITTED
+from ocr import split_image_bundle
+
+
+logger = logging.getLogger(__name__)
+
+# SQLite file holding queued jobs and their results. Every server process on the node
+# that points at the same file drains the same queue.
+JOBS_DB = os.environ.get("JOBS_DB") or os.path.join(tempfile.gettempdir(), "stats_parser_jobs.sqlite3")
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 1))
+# Workers renew the lease of a running job while they work on it; a job whose lease
+# ran out is handed to another worker (its worker is assumed dead), and after
+# JOB_MAX_ATTEMPTS it fails
+JOB_LEASE_S = float(os.environ.get("JOB_LEASE_S", 600))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 3))
+JOB_RESULT_TTL_S = float(os.environ.get("JOB_RESULT_TTL_S", 24 * 3600))
+JOB_POLL_INTERVAL_S = 0.5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    images BLOB,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    lease_until REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created_at);
+"""
+
+
+class JobFailed(Exception):
+    """Raised by job handlers with the JSON error payload to store for the job."""
+
+    def __init__(self, error: dict[str, Any]):
+        super().__init__(error.get("detail", "job failed"))
+        self.error = error
+
+
+def pack_images(images: list[bytes]) -> bytes:
+    """Frames images as 4-byte big-endian lengths followed by the bytes, the format
+    `ocr.split_image_bundle` reads."""
+    return b"".join(len(image).to_bytes(4, "big") + image for image in images)
+
+
+class JobStore:
+    """Durable job queue and result store in one SQLite file.
+
+    Jobs go from "queued" to "running" (claimed by one worker under a lease) to
+    "done" with a JSON result or "failed" with a JSON error. Only the worker
+    holding a job can renew its lease, finish it or put it back. Images are
+    dropped once a job finishes. Connections are opened per call, so a store can
+    be used from any thread and survives forking.
+    """
+
+    def __init__(self, path: str = JOBS_DB):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        # Autocommit; `_claim` opens its own transaction
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def submit(self, kind: str, images: list[bytes], params: dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, params, images, status, created_at) VALUES (?, ?, ?, ?, 'queued', ?)",
+                (job_id, kind, json.dumps(params), pack_images(images), time.time()),
+            )
+        JOBS_SUBMITTED.inc()
+        return job_id
+
+    def get(self, job_id: str) -> dict[str, Any] | None:
+        """The job's status fields, with `result` and `error` decoded, or None if unknown."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, kind, status, result, error, attempts, created_at, started_at, finished_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["error"] = json.loads(job["error"]) if job["error"] else None
+        return job
+
+    def claim(self, worker: str, lease_s: float = JOB_LEASE_S) -> dict[str, Any] | None:
+        """Takes the oldest queued job (or one whose lease ran out) for `worker`.
+
+        Returns its id, kind, params and images, or None when the queue is empty.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            return self._claim(conn, worker, now, lease_s)
+
+    def _claim(self, conn: sqlite3.Connection, worker: str, now: float, lease_s: float) -> dict[str, Any] | None:
+        while True:
+            # IMMEDIATE takes the write lock up front, so two workers never claim the same job
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT id, kind, params, images, attempts FROM jobs"
+                    " WHERE status = 'queued' OR (status = 'running' AND lease_until < ?)"
+                    " ORDER BY created_at LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is not None and row["attempts"] >= JOB_MAX_ATTEMPTS:
+                    # Its workers keep dying on it; stop retrying
+                    self._finish(conn, row["id"], "failed", None, error={
+                        "code": "internal_server_error",
+                        "detail": "The job was interrupted too many times.",
+                    })
+                    conn.execute("COMMIT")
+                    continue
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1,"
+                        " started_at = ?, lease_until = ? WHERE id = ?",
+                        (worker, now, now + lease_s, row["id"]),
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            if row is None:
+                return None
+            return {"id": row["id"], "kind": row["kind"], "params": json.loads(row["params"]), "images": row["images"]}
+
+    def renew(self, job_id: str, worker: str, lease_s: float = JOB_LEASE_S) -> bool:
+        """Extends `worker`'s lease on a running job; False if it no longer holds the job."""
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                (time.time() + lease_s, job_id, worker),
+            ).rowcount > 0
+
+    def requeue(self, job_id: str, worker: str) -> bool:
+        """Puts a job `worker` is running back in the queue, without counting the attempt."""
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE jobs SET status = 'queued', worker = NULL, lease_until = NULL, attempts = attempts - 1"
+                " WHERE id = ? AND worker = ? AND status = 'running'",
+                (job_id, worker),
+            ).rowcount > 0
+
+    def complete(self, job_id: str, worker: str, result: dict[str, Any]) -> bool:
+        """Stores the result of a job `worker` is running; False if it no longer holds the job."""
+        with self._connect() as conn:
+            return self._finish(conn, job_id, "done", worker, result=result)
+
+    def fail(self, job_id: str, worker: str, error: dict[str, Any]) -> bool:
+        with self._connect() as conn:
+            return self._finish(conn, job_id, "failed", worker, error=error)
+
+    def _finish(
+        self, conn: sqlite3.Connection, job_id: str, status: str, worker: str | None, result: Any = None, error: Any = None
+    ) -> bool:
+        # A worker whose lease ran out may still finish; the job belongs to whoever claimed it since
+        query = "UPDATE jobs SET status = ?, result = ?, error = ?, images = NULL, finished_at = ?, lease_until = NULL WHERE id = ?"
+        params = [status, json.dumps(result) if result is not None else None,
+                  json.dumps(error) if error is not None else None, time.time(), job_id]
+        if worker is not None:
+            query += " AND worker = ? AND status = 'running'"
+            params.append(worker)
+        finished = conn.execute(query, params).rowcount > 0
+        if finished:
+            JOBS_FINISHED.labels(status).inc()
+        return finished
+
+    def purge(self, ttl_s: float = JOB_RESULT_TTL_S) -> int:
+        """Deletes jobs that finished more than `ttl_s` ago; returns how many."""
+        with self._connect() as conn:
+            return conn.execute(
+                "DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (time.time() - ttl_s,)
+            ).rowcount
+
+
+class JobWorkers:
+    """Threads that drain a `JobStore`, running each job with `handlers[kind]`.
+
+    A handler gets the job's images (as memoryviews) and params and returns the
+    JSON result; raising `JobFailed` stores its error payload, and any other
+    exception a generic internal error. The job's lease is renewed while its
+    handler runs.
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        handlers: dict[str, Callable[[list[memoryview], dict[str, Any]], dict[str, Any]]],
+        count: int = JOB_WORKERS,
+    ):
+        self.store = store
+        self.handlers = handlers
+        self.count = count
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        # Job each worker is running, by worker name
+        self._running: dict[str, str] = {}
+        self._running_lock = threading.Lock()
+
+    def start(self) -> None:
+        for i in range(self.count):
+            thread = threading.Thread(target=self._run, args=(f"{socket.gethostname()}:{os.getpid()}:{i}",), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: float | None = None) -> None:
+        """Stops taking new jobs. Running ones get `timeout` seconds to finish (per
+        worker); the rest are put back in the queue for the next worker."""
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads.clear()
+        with self._running_lock:
+            unfinished = list(self._running.items())
+        for worker, job_id in unfinished:
+            try:
+                self.store.requeue(job_id, worker)
+            except sqlite3.Error:
+                logger.exception("could not requeue job %s", job_id)
+
+    def notify(self) -> None:
+        """Wakes an idle worker, e.g. right after a job was submitted in this process."""
+        self._wake.set()
+
+    def _run(self, worker: str) -> None:
+        last_purge = 0.0
+        while not self._stop.is_set():
+            if time.monotonic() - last_purge > 3600:
+                last_purge = time.monotonic()
+                self.store.purge()
+            try:
+                job = self.store.claim(worker)
+            except sqlite3.Error:
+                logger.exception("could not claim a job")
+                job = None
+            if job is None:
+                # Jobs submitted by other processes are picked up on the next poll
+                self._wake.wait(JOB_POLL_INTERVAL_S)
+                self._wake.clear()
+                continue
+            self._execute(job, worker)
+
+    def _execute(self, job: dict[str, Any], worker: str) -> None:
+        with self._running_lock:
+            self._running[worker] = job["id"]
+        done = threading.Event()
+        renewer = threading.Thread(target=self._renew_lease, args=(job["id"], worker, done), daemon=True)
+        renewer.start()
+        try:
+            handler = self.handlers[job["kind"]]
+            result = handler(split_image_bundle(job["images"]), job["params"])
+        except JobFailed as exc:
+            self.store.fail(job["id"], worker, exc.error)
+        except Exception:
+            logger.exception("job %s failed", job["id"])
+            self.store.fail(job["id"], worker, {"code": "internal_server_error", "detail": "An unexpected error occurred"})
+        else:
+            if not self.store.complete(job["id"], worker, result):
+                logger.warning("job %s was taken over by another worker; dropping its result", job["id"])
+        finally:
+            done.set()
+            with self._running_lock:
+                self._running.pop(worker, None)
+
+    def _renew_lease(self, job_id: str, worker: str, done: threading.Event) -> None:
+        while not done.wait(JOB_LEASE_S / 3):
+            try:
+                if not self.store.renew(job_id, worker):
+                    return
+            except sqlite3.Error:
+                logger.exception("could not renew the lease of job %s", job_id)
@@ -0,0 +1,211 @@
+import os
+from typing import Any, Callable, Iterable, Sequence
+
+import cv2
+import numpy as np
+
+from glyphs import GlyphMatcher, glyph_matcher
+from metrics import GLYPH_CELLS
+from timings import timed
+
+# Layout-template mode: pages with a fixed table layout skip text detection. Text rows
+# and their cells are found from the image gradient, and only the recognition model
+# runs, on the cell crops. Pages that do not match a template get a full OCR instead.
+LAYOUT_TEMPLATES = os.environ.get("LAYOUT_TEMPLATES", "1") == "1"
+
+# Gradient (0-255) that counts as a text stroke; row background shades stay well below
+INK_THRESHOLD = 40
+# Cells in a row are split at gaps wider than this fraction of the row height
+CELL_GAP = 0.8
+# Wider cells (width / height) are borders and separators, not text; a single one
+# would make the recognizer pad its whole batch to that width
+MAX_CELL_ASPECT = 20
+
+
+def has_digit(text: str) -> bool:
+    return any(c.isdigit() for c in text)
+
+
+class LayoutTemplate:
+    """A table layout of a page: each row holds `cells` in order, "label" or "value".
+
+    A page matches when at least `min_labels` distinct labels from `labels`
+    (lowercase) are read, and every row holding one has the template's cells
+    around it, with each value cell passing `is_value`. Cells outside that span
+    (side decorations) are ignored. A row with a label but a missing or
+    unreadable value fails the whole page, so it is never parsed as a zero.
+
+    With `ordered`, `labels` is the order rows appear on screen and the labels
+    read must be consecutive in it, so a row the segmentation dropped fails the
+    page. With `strict_values`, a row between two labelled rows that holds a
+    value but no known label (a misread or mis-split label) fails the page too;
+    rows above and below the labelled ones may be other tables.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        cells: Sequence[str],
+        labels: Iterable[str],
+        min_labels: int = 1,
+        is_value: Callable[[str], bool] | None = None,
+        ordered: bool = False,
+        strict_values: bool = False,
+    ):
+        self.name = name
+        self.cells = tuple(cells)
+        self.order = tuple(labels) if ordered else None
+        self.labels = frozenset(labels)
+        self.min_labels = min_labels
+        # Module-level functions only: templates are pickled to process-pool workers
+        self.is_value = is_value or has_digit
+        self.strict_values = strict_values
+
+    def matches(self, rows: list[list[tuple[list[list[float]], str, float]]]) -> bool:
+        found = []
+        # Rows with a value but no known label, by whether a labelled row came before
+        unlabelled: list[int] = []
+        for row in rows:
+            texts = [" ".join(text.lower().split()) for _, text, _ in row]
+            at = next((i for i, text in enumerate(texts) if text in self.labels), None)
+            if at is None:
+                if found and any(self.is_value(text) for text in texts):
+                    unlabelled.append(len(found))
+                continue
+            start = at - self.cells.index("label")
+            if start < 0 or start + len(self.cells) > len(row):
+                return False
+            for kind, text in zip(self.cells, texts[start:]):
+                if kind == "value" and not self.is_value(text):
+                    return False
+            found.append(texts[at])
+        if len(set(found)) < self.min_labels:
+            return False
+        if self.strict_values and any(after < len(found) for after in unlabelled):
+            return False
+        if self.order is not None:
+            positions = [self.order.index(label) for label in found]
+            if positions != list(range(positions[0], positions[0] + len(positions))):
+                return False
+        return True
+
+
+def ink_mask(img: Any) -> np.ndarray:
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    gradient = cv2.morphologyEx(gray, cv2.MORPH_GRADIENT, np.ones((3, 3), np.uint8))
+    return gradient > INK_THRESHOLD
+
+
+def _runs(profile: np.ndarray, min_gap: int) -> list[tuple[int, int]]:
+    """Half-open [start, end) runs of True in `profile`, joining runs closer than `min_gap`."""
+    padded = np.concatenate(([False], profile, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    runs: list[tuple[int, int]] = []
+    for start, end in zip(edges[::2], edges[1::2]):
+        if runs and start - runs[-1][1] < min_gap:
+            runs[-1] = (runs[-1][0], int(end))
+        else:
+            runs.append((int(start), int(end)))
+    return runs
+
+
+def find_rows(mask: np.ndarray, line: float) -> list[tuple[int, int]]:
+    """Text rows as [top, bottom) runs of the mask's row profile.
+
+    Rows are separated where few pixels are ink, so side decorations spanning
+    several rows do not join them, then grown into the fainter pixel rows at
+    their edges (ascenders, descenders), up to half the gap to their neighbours.
+    """
+    profile = mask.sum(axis=1)
+    width = mask.shape[1]
+    weak = profile > max(4, width // 100)
+    cores = _runs(profile > max(4, width // 25), max(1, int(line * 0.15)))
+    rows = []
+    for i, (top, bottom) in enumerate(cores):
+        reach = (bottom - top) // 2
+        upper = max(top - reach, (cores[i - 1][1] + top + 1) // 2 if i else 0)
+        lower = min(bottom + reach, (bottom + cores[i + 1][0]) // 2 if i + 1 < len(cores) else len(profile))
+        while top > upper and weak[top - 1]:
+            top -= 1
+        while bottom < lower and weak[bottom]:
+            bottom += 1
+        rows.append((top, bottom))
+    return rows
+
+
+def find_cells(img: Any, text_height_per_width: float = 0.035) -> list[list[tuple[int, int, int, int]]]:
+    """Finds text rows and splits each into cells at wide gaps.
+
+    Returns the rows top to bottom, each a list of `(left, top, right, bottom)`
+    cell boxes from left to right. Rows much taller than a line of text (icons,
+    portraits) are dropped.
+    """
+    width = img.shape[1]
+    mask = ink_mask(img)
+    line = max(4.0, width * text_height_per_width)
+    rows = []
+    for top, bottom in find_rows(mask, line):
+        row_height = bottom - top
+        if not line * 0.4 <= row_height <= line * 2.5:
+            continue
+        cells = []
+        columns = mask[top:bottom].sum(axis=0) > 0
+        for left, right in _runs(columns, max(1, int(row_height * CELL_GAP))):
+            if row_height * 0.25 <= right - left <= row_height * MAX_CELL_ASPECT:
+                # Fit each cell to its own ink, the row may be taller (decorations)
+                ink_rows = np.flatnonzero(mask[top:bottom, left:right].any(axis=1))
+                cells.append((left, top + int(ink_rows[0]), right, top + int(ink_rows[-1]) + 1))
+        if cells:
+            rows.append(cells)
+    return rows
+
+
+def crop_cell(img: Any, cell: tuple[int, int, int, int]) -> Any:
+    """The cell with a margin of a fifth of its height, as the recognizer expects."""
+    left, top, right, bottom = cell
+    pad = max(2, (bottom - top) // 5)
+    crop = img[max(0, top - pad):bottom + pad, max(0, left - pad):right + pad]
+    return cv2.cvtColor(crop, cv2.COLOR_GRAY2BGR) if crop.ndim == 2 else crop
+
+
+def read_layout(
+    img: Any,
+    templates: Sequence[LayoutTemplate],
+    recognize: Callable[[list[Any]], list[tuple[str, float]]],
+    glyphs: GlyphMatcher | None = glyph_matcher,
+) -> list[tuple[list[list[float]], str, float]] | None:
+    """Reads a page with recognition only, if it matches one of `templates`.
+
+    Numeric cells `glyphs` reads confidently skip the recognizer; the remaining
+    cells are recognized in one batch. Cells are returned in the same
+    `(bbox, text, confidence)` format as a full OCR, so the parsers need no
+    changes. Returns None when no template matches.
+    """
+    rows = find_cells(img)
+    cells = [cell for row in rows for cell in row]
+    if not cells:
+        return None
+    texts: list[tuple[str, float] | None] = [None] * len(cells)
+    if glyphs is not None:
+        with timed("match_glyphs"):
+            for i, (left, top, right, bottom) in enumerate(cells):
+                texts[i] = glyphs.read(img[top:bottom, left:right])
+    pending = [i for i, text in enumerate(texts) if text is None]
+    GLYPH_CELLS.labels("glyphs").inc(len(cells) - len(pending))
+    GLYPH_CELLS.labels("ocr").inc(len(pending))
+    if pending:
+        for i, text in zip(pending, recognize([crop_cell(img, cells[i]) for i in pending])):
+            texts[i] = text
+    texts = iter(texts)
+    result_rows = []
+    for row in rows:
+        result_row = []
+        for left, top, right, bottom in row:
+            text, confidence = next(texts)
+            if text:
+                bbox = [[float(left), float(top)], [float(right), float(top)], [float(right), float(bottom)], [float(left), float(bottom)]]
+                result_row.append((bbox, text, float(confidence)))
+        result_rows.append(result_row)
+    if not any(template.matches(result_rows) for template in templates):
+        return None
+    return [entry for row in result_rows for entry in row]
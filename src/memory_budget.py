@@ -0,0 +1,41 @@
+import os
+import threading
+
+
+REQUEST_MEMORY_BUDGET = int(os.environ.get("REQUEST_MEMORY_BUDGET", 256 * 1024 * 1024))
+PROCESS_MEMORY_BUDGET = int(os.environ.get("PROCESS_MEMORY_BUDGET", 2 * 1024 * 1024 * 1024))
+MEMORY_BUDGET_WAIT_S = float(os.environ.get("MEMORY_BUDGET_WAIT_S", 30))
+
+
+class MemoryBudgetExceeded(RuntimeError):
+    """Raised when decoded images would not fit in the memory budget in time."""
+
+
+class MemoryBudget:
+    """Counts bytes of decoded images held by the process.
+
+    `reserve` blocks while the budget is full, queueing the caller, and raises
+    MemoryBudgetExceeded if room does not free up within `wait_s` seconds.
+    """
+
+    def __init__(self, max_bytes: int = PROCESS_MEMORY_BUDGET, wait_s: float = MEMORY_BUDGET_WAIT_S):
+        self.max_bytes = max_bytes
+        self.wait_s = wait_s
+        self.used = 0
+        self._cond = threading.Condition()
+
+    def reserve(self, nbytes: int) -> None:
+        if nbytes > self.max_bytes:
+            raise MemoryBudgetExceeded("image does not fit in the process memory budget.")
+        with self._cond:
+            if not self._cond.wait_for(lambda: self.used + nbytes <= self.max_bytes, timeout=self.wait_s):
+                raise MemoryBudgetExceeded("server is out of memory for decoding images, try again later.")
+            self.used += nbytes
+
+    def release(self, nbytes: int) -> None:
+        with self._cond:
+            self.used -= nbytes
+            self._cond.notify_all()
+
+
+process_memory_budget = MemoryBudget()
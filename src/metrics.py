@@ -0,0 +1,75 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+
+# Counts are per server process; scrape every worker.
+STAGE_SECONDS = Histogram(
+    "stats_parser_stage_seconds",
+    "Time spent in one pipeline stage for one image (or one call, for merge_boxes and parse)",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+REQUEST_SECONDS = Histogram(
+    "stats_parser_request_seconds",
+    "End-to-end time of API requests",
+    ["path"],
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80),
+)
+IMAGES_PER_REQUEST = Histogram(
+    "stats_parser_images_per_request",
+    "Images uploaded per parse",
+    ["parser"],
+    buckets=(1, 2, 3, 5, 8, 12, 16, 20, 30, 50),
+)
+PAGES_OCR = Histogram(
+    "stats_parser_pages_ocr_per_request",
+    "Images per parse that were fully OCR'd (result=ocr) or skipped (result=skipped)",
+    ["parser", "result"],
+    buckets=(0, 1, 2, 3, 5, 8, 12, 16, 20, 30, 50),
+)
+DETECTIONS_PER_PAGE = Histogram(
+    "stats_parser_detections_per_page",
+    "Text boxes OCR returned for one page",
+    buckets=(0, 5, 10, 20, 30, 40, 50, 75, 100, 200),
+)
+ADMISSION_QUEUED = Gauge(
+    "stats_parser_admission_queued_requests",
+    "Parse requests waiting for admission",
+)
+ADMISSION_REJECTED = Counter(
+    "stats_parser_admission_rejected",
+    "Parse requests rejected with 429 because the queue was full or too slow",
+)
+LAYOUT_PAGES = Counter(
+    "stats_parser_layout_pages",
+    "Pages read in layout-template mode (result=template) or that fell back to full OCR (result=fallback)",
+    ["result"],
+)
+GLYPH_CELLS = Counter(
+    "stats_parser_glyph_cells",
+    "Layout-template cells read by glyph matching (result=glyphs) or by the OCR engine (result=ocr)",
+    ["result"],
+)
+JOBS_SUBMITTED = Counter(
+    "stats_parser_jobs_submitted",
+    "Jobs submitted to the job queue",
+)
+JOBS_FINISHED = Counter(
+    "stats_parser_jobs_finished",
+    "Jobs finished by this process, by status (done or failed)",
+    ["status"],
+)
+DUPLICATE_PAGES = Counter(
+    "stats_parser_duplicate_pages",
+    "Pages that repeated earlier pages of their request and were not OCR'd (result=skipped), or were cropped to their new rows (result=cropped)",
+    ["parser", "result"],
+)
+VIDEO_FRAMES = Counter(
+    "stats_parser_video_frames",
+    "Frames of uploaded screen recordings that were decoded (result=sampled) or OCR'd as keyframes (result=keyframe)",
+    ["result"],
+)
+STITCHED_ROWS = Counter(
+    "stats_parser_stitched_rows",
+    "Text rows of stitched screenshots that were new (result=unique) or already on an earlier screenshot (result=duplicate)",
+    ["result"],
+)
@@ -1,12 +1,135 @@
-from typing import Any, List, Tuple, Union
+from io import BytesIO
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, List, Sequence, Tuple, Union
+import binascii
+import logging
+import os
+import threading
+import time
+import weakref
 
-from rapidocr_onnxruntime import RapidOCR
 import cv2
 import numpy as np
 import base64
 
+from ocr_pool import OCRPool
+from ocr_cache import ocr_cache
+from ocr_batcher import ocr_batcher
+from memory_budget import MemoryBudget, REQUEST_MEMORY_BUDGET, process_memory_budget
+from timings import record, record_ocr_elapse, timed
+from metrics import DETECTIONS_PER_PAGE, LAYOUT_PAGES
+from layout import LAYOUT_TEMPLATES, LayoutTemplate, read_layout
+from dedup import PageDeduper
+from ort_settings import MODELS_CACHE_TAG, new_rapidocr
+from engines import OCREngine, register_engine, resolve_engine
+from preprocess import OCR_GRAYSCALE, OCR_TARGET_TEXT_HEIGHT, prepare_image, reduced_decode, scale_boxes, target_scale
+from PIL import Image
 
-rapidocr_reader = RapidOCR()
+if TYPE_CHECKING:
+    from rapidocr_onnxruntime import RapidOCR
+
+logger = logging.getLogger(__name__)
+
+# Header-strip probe: only the top of the page is OCR'd, downscaled and without the
+# angle classifier, to tell which pages are worth a full OCR pass.
+PAGE_PROBE_STRIP_FRACTION = float(os.environ.get("PAGE_PROBE_STRIP_FRACTION", 0.35))
+PAGE_PROBE_DET_SIDE = int(os.environ.get("PAGE_PROBE_DET_SIDE", 960))
+
+# Engines are only built on first use (or by `preload` / `warm_up`), so importing the
+# parsers does not load any model.
+_shared_readers: dict[str, "RapidOCR"] = {}
+_shared_readers_lock = threading.Lock()
+_worker_local = threading.local()
+
+
+def _new_reader(kind: str, **options: Any) -> "RapidOCR":
+    if kind == "probe":
+        return new_rapidocr(det_limit_type="max", det_limit_side_len=PAGE_PROBE_DET_SIDE, use_cls=False, **options)
+    return new_rapidocr(**options)
+
+
+def shared_reader(kind: str = "full") -> "RapidOCR":
+    """The process-wide engine of `kind` ("full" or "probe"), built on first use."""
+    reader = _shared_readers.get(kind)
+    if reader is None:
+        with _shared_readers_lock:
+            reader = _shared_readers.get(kind)
+            if reader is None:
+                reader = _shared_readers[kind] = _new_reader(kind)
+    return reader
+
+
+def preload(**options: Any) -> None:
+    """Builds the process-wide engines now, with RapidOCR `options` (e.g. intra_op_num_threads)."""
+    with _shared_readers_lock:
+        for kind in ("full", "probe"):
+            if kind not in _shared_readers:
+                _shared_readers[kind] = _new_reader(kind, **options)
+
+
+def _init_pool_worker() -> None:
+    # With several workers each one builds its own engines, so concurrent calls never
+    # share a session. A single worker uses the process-wide ones, which a pre-fork
+    # parent may already have loaded.
+    _worker_local.private_engines = ocr_pool.size > 1
+
+
+def _get_reader(kind: str = "full") -> "RapidOCR":
+    if not getattr(_worker_local, "private_engines", False):
+        return shared_reader(kind)
+    reader = getattr(_worker_local, kind, None)
+    if reader is None:
+        reader = _new_reader(kind)
+        setattr(_worker_local, kind, reader)
+    return reader
+
+
+def _get_probe_reader() -> "RapidOCR":
+    return _get_reader("probe")
+
+
+def _synthetic_page() -> Any:
+    """A small page of stat-like text lines, enough to exercise detection, the angle
+    classifier and recognition."""
+    # Square at the detector's default minimum side (736), so it is not upscaled
+    img = np.full((736, 736, 3), 255, np.uint8)
+    for row, line in enumerate(("Battle Overview", "Infantry Attack", "+129.92%", "871,171")):
+        cv2.putText(img, line, (40, 120 + row * 160), cv2.FONT_HERSHEY_SIMPLEX, 1.6, (0, 0, 0), 3)
+    return img
+
+
+def _warm_up_worker(img: Any, barrier: threading.Barrier | None) -> None:
+    if barrier is not None:
+        # Hold each task until all have started, so every pool thread gets one
+        barrier.wait(timeout=60)
+    for kind in ("full", "probe"):
+        _get_reader(kind)(img)
+
+
+def warm_up(pool: bool = True) -> float:
+    """Loads the engines and runs each once on a synthetic page, so the first request
+    does not pay for model loading or ONNX Runtime's first-run setup.
+
+    With `pool`, every OCR pool worker (and the batcher, if enabled) is warmed too.
+    Returns the seconds taken.
+    """
+    start = time.perf_counter()
+    img = _synthetic_page()
+    if pool and (ocr_pool.size > 1 or ocr_pool.backend == "process"):
+        # Workers have their own engines; the process-wide ones are never used
+        barrier = threading.Barrier(ocr_pool.size) if ocr_pool.backend == "thread" else None
+        futures = [ocr_pool.submit(_warm_up_worker, img, barrier) for _ in range(ocr_pool.size)]
+        for future in futures:
+            future.result()
+    else:
+        _warm_up_worker(img, None)
+    if pool and ocr_batcher is not None:
+        ocr_batcher.submit_image(img).result()
+    elapsed = time.perf_counter() - start
+    logger.info("OCR engines warmed up in %.2fs", elapsed)
+    return elapsed
+
+
+ocr_pool = OCRPool(initializer=_init_pool_worker)
 
 
 def normalize_rapidocr_result(
@@ -20,30 +143,305 @@ def normalize_rapidocr_result(
     for detection in detections:
         bbox = detection[0]
         text = detection[1]
-        confidence = detection[2]
+        confidence = float(detection[2])
         normalized.append((bbox, text, confidence))
     return normalized
 
 
+def decode_image_bytes(data: bytes | memoryview, flags: int = cv2.IMREAD_COLOR) -> Any:
+    """Decodes an encoded image (PNG, JPG, ...) straight from a buffer, without copying it."""
+    img = cv2.imdecode(np.frombuffer(data, np.uint8), flags)
+    if img is None:
+        raise ValueError("image could not be decoded.")
+    return img
+
+
+def decode_images_from_bytes(images_data: list[bytes | memoryview]) -> list[Any]:
+    return [decode_image_bytes(data) for data in images_data]
+
+
 def decode_images_from_b64(images_b64: list[str]) -> list[Any]:
-    imgdata = [base64.b64decode(data) for data in images_b64]
-    images = [cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR) for data in imgdata]
+    return [decode_image_bytes(base64.b64decode(data)) for data in images_b64]
+
+
+def split_image_bundle(bundle: bytes) -> list[memoryview]:
+    """Splits an octet-stream bundle into per-image views over the same buffer.
+
+    The bundle is a sequence of frames, each a 4-byte big-endian length followed
+    by that many bytes of an encoded image.
+    """
+    view = memoryview(bundle)
+    images = []
+    offset = 0
+    while offset < len(view):
+        if offset + 4 > len(view):
+            raise ValueError("image bundle is truncated.")
+        length = int.from_bytes(view[offset:offset + 4], "big")
+        offset += 4
+        if length == 0 or offset + length > len(view):
+            raise ValueError("image bundle is truncated.")
+        images.append(view[offset:offset + length])
+        offset += length
+    if not images:
+        raise ValueError("image bundle is empty.")
     return images
 
 
+def encoded_image_size(data: bytes | memoryview) -> tuple[int, int] | None:
+    """Reads (width, height) from an encoded image's header without decoding it."""
+    try:
+        with Image.open(BytesIO(data)) as img:
+            return img.size
+    except Exception:
+        return None
+
+
+class LazyImages(Sequence):
+    """Encoded images that are decoded only when accessed, and never kept.
+
+    Each access decodes a fresh page and runs it through `prepare_image`, so
+    callers that OCR one image at a time only hold the images in flight. When
+    the target text height allows it, OpenCV decodes at a reduced resolution
+    directly. Decoded bytes are reserved in the process-wide `memory_budget`
+    until the page is garbage collected, which queues (or rejects) decoding when
+    the process is full. `request_budget` bounds how many decoded bytes this
+    request may hold at once: it caps `max_concurrency`. An image larger than
+    either budget could never be decoded and is rejected with ValueError; only
+    waiting too long for room in a busy process raises MemoryBudgetExceeded.
+    """
+
+    def __init__(
+        self,
+        sources: Sequence[str | bytes | memoryview],
+        is_b64: bool = False,
+        request_budget: int = REQUEST_MEMORY_BUDGET,
+        memory_budget: MemoryBudget = process_memory_budget,
+        target_text_height: float = OCR_TARGET_TEXT_HEIGHT,
+        grayscale: bool = OCR_GRAYSCALE,
+    ):
+        self.sources = sources
+        self.is_b64 = is_b64
+        self.request_budget = request_budget
+        self.memory_budget = memory_budget
+        self.target_text_height = target_text_height
+        self.grayscale = grayscale
+        self._max_concurrency: int | None = None
+
+    @classmethod
+    def from_b64(cls, images_b64: Sequence[str], **kwargs: Any) -> "LazyImages":
+        return cls(images_b64, is_b64=True, **kwargs)
+
+    def __len__(self) -> int:
+        return len(self.sources)
+
+    def __iter__(self) -> Iterator[Any]:
+        # Sequence's default looks up one index past the end to find where it stops
+        return (self[idx] for idx in range(len(self)))
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return LazyImages(
+                self.sources[idx], self.is_b64, self.request_budget, self.memory_budget,
+                self.target_text_height, self.grayscale,
+            )
+        return self._decode(idx)
+
+    def _decode(self, idx: int) -> Any:
+        data = self._encoded(idx)
+        size = encoded_image_size(data)
+        if size is None:
+            with timed("decode"):
+                return prepare_image(decode_image_bytes(data), self.target_text_height, self.grayscale)
+        flag, factor = reduced_decode(target_scale(size[0], self.target_text_height), self.grayscale)
+        nbytes = self._decoded_bytes(size, factor)
+        if nbytes > min(self.request_budget, self.memory_budget.max_bytes):
+            raise ValueError("image is too large to process.")
+        # Waiting for room is not decode time
+        self.memory_budget.reserve(nbytes)
+        try:
+            with timed("decode"):
+                img = prepare_image(decode_image_bytes(data, flag), self.target_text_height, self.grayscale, size[0])
+        except Exception:
+            self.memory_budget.release(nbytes)
+            raise
+        weakref.finalize(img, self.memory_budget.release, nbytes)
+        return img
+
+    @property
+    def max_concurrency(self) -> int:
+        """How many of these images fit in the request budget at once."""
+        if self._max_concurrency is None:
+            largest = 0
+            for idx in range(len(self)):
+                size = self._header_size(idx)
+                if size is not None:
+                    _, factor = reduced_decode(target_scale(size[0], self.target_text_height), self.grayscale)
+                    largest = max(largest, self._decoded_bytes(size, factor))
+            self._max_concurrency = max(1, self.request_budget // largest) if largest else len(self) or 1
+        return self._max_concurrency
+
+    def _decoded_bytes(self, size: tuple[int, int], factor: int) -> int:
+        # What imdecode allocates; the prepared page is never larger
+        channels = 1 if self.grayscale else 3
+        return -(-size[0] // factor) * -(-size[1] // factor) * channels
+
+    def _encoded(self, idx: int) -> bytes | memoryview:
+        data = self.sources[idx]
+        return base64.b64decode(data) if self.is_b64 else data
+
+    def _header_size(self, idx: int) -> tuple[int, int] | None:
+        if self.is_b64:
+            # Image headers sit at the start of the file; only decode the whole
+            # payload when the first few KB are not enough (e.g. large JPEG EXIF)
+            try:
+                size = encoded_image_size(base64.b64decode(self.sources[idx][:8192]))
+            except (binascii.Error, ValueError):
+                size = None
+            if size is not None:
+                return size
+        return encoded_image_size(self._encoded(idx))
+
+
+def request_concurrency(images: Any, max_concurrency: int | None = None) -> int | None:
+    """Caps `max_concurrency` to what the request's memory budget allows."""
+    if isinstance(images, LazyImages):
+        return min(max_concurrency or images.max_concurrency, images.max_concurrency)
+    return max_concurrency
+
+
+class RapidOCREngine(OCREngine):
+    """The default engine. `lite` uses the probe configuration for whole pages:
+    detection on a downscaled page and no angle classifier."""
+
+    requires = ("rapidocr_onnxruntime",)
+
+    def __init__(self, lite: bool = False):
+        self.name = "rapidocr_lite" if lite else "rapidocr"
+        self.lite = lite
+
+    def read(self, img: Any) -> list[tuple[list[list[float]], str, float]]:
+        if self.lite:
+            result = _get_reader("probe")(img)
+            record_ocr_elapse(result[1])
+            return normalize_rapidocr_result(result)
+        return normalize_rapidocr_result(_run_reader(img))
+
+    def read_strip(self, img: Any) -> list[tuple[list[list[float]], str, float]]:
+        return normalize_rapidocr_result(_run_probe_reader(img))
+
+    recognizes_crops = True
+
+    def recognize(self, crops: list[Any]) -> list[tuple[str, float]]:
+        texts, elapse = _get_reader("full").text_rec(crops)
+        record("recognize", elapse)
+        return texts
+
+
+register_engine(RapidOCREngine())
+register_engine(RapidOCREngine(lite=True))
+
+
 def ocr_image(img: Any, ocr_engine: str = "rapidocr") -> list[tuple[list[list[float]], str, float]]:
-    # Currently only RapidOCR is supported; keep structure for future engines
-    result = rapidocr_reader(img)
-    return normalize_rapidocr_result(result)
+    engine = resolve_engine(ocr_engine)
+    result = _cached_ocr(img, engine.name, lambda: engine.read(img))
+    DETECTIONS_PER_PAGE.observe(len(result))
+    # Pages from `prepare_image` may be downscaled; report boxes in screenshot coordinates
+    return scale_boxes(result, getattr(img, "scale", 1.0))
+
+
+def ocr_page(
+    img: Any,
+    ocr_engine: str = "rapidocr",
+    layouts: Sequence[LayoutTemplate] = (),
+) -> list[tuple[list[list[float]], str, float]]:
+    """OCRs a page with recognition only if it matches one of `layouts` (see
+    `layout.read_layout`), and with the full pipeline otherwise."""
+    engine = resolve_engine(ocr_engine)
+    if not layouts or not LAYOUT_TEMPLATES or not engine.recognizes_crops:
+        return ocr_image(img, ocr_engine)
+    cache_engine = f"{engine.name}:layout:{','.join(layout.name for layout in layouts)}"
+    result = _cached_ocr(img, cache_engine, lambda: read_layout(img, layouts, engine.recognize) or [])
+    if not result:
+        LAYOUT_PAGES.labels("fallback").inc()
+        return ocr_image(img, ocr_engine)
+    LAYOUT_PAGES.labels("template").inc()
+    return scale_boxes(result, getattr(img, "scale", 1.0))
+
+
+def _run_reader(img: Any) -> Tuple[Any, Any]:
+    # With OCR_BATCHING on, concurrent calls are batched together by the scheduler
+    if ocr_batcher is not None:
+        result = ocr_batcher.submit_image(img).result()
+    else:
+        result = _get_reader("full")(img)
+    record_ocr_elapse(result[1])
+    return result
+
+
+def _cached_ocr(
+    img: Any,
+    cache_engine: str,
+    run: Callable[[], list[tuple[list[list[float]], str, float]]],
+) -> list[tuple[list[list[float]], str, float]]:
+    if not ocr_cache.enabled:
+        return run()
+    key = ocr_cache.key_for(img, cache_engine + MODELS_CACHE_TAG)
+    cached = ocr_cache.get(key)
+    if cached is not None:
+        return cached
+    result = run()
+    ocr_cache.put(key, result)
+    return result
+
+
+def ocr_header_strip(
+    img: Any,
+    ocr_engine: str = "rapidocr",
+    fraction: float = PAGE_PROBE_STRIP_FRACTION,
+) -> list[tuple[list[list[float]], str, float]]:
+    """Cheaply OCRs the top `fraction` of a page (title bar and first section banner).
+
+    Meant to run on the OCR pool: each worker lazily builds its own probe engine.
+    """
+    engine = resolve_engine(ocr_engine)
+    strip = img[: max(1, int(img.shape[0] * fraction))]
+    result = _cached_ocr(strip, f"{engine.name}:probe", lambda: engine.read_strip(strip))
+    return scale_boxes(result, getattr(img, "scale", 1.0))
+
+
+def _run_probe_reader(strip: Any) -> Tuple[Any, Any]:
+    # Timed as one stage, so page search cost is not mixed into full-page OCR
+    with timed("probe"):
+        return _get_probe_reader()(strip)
+
+
+def ocr_images_iter(
+    images: Iterable[Any],
+    ocr_engine: str = "rapidocr",
+    max_concurrency: int | None = None,
+    layouts: Sequence[LayoutTemplate] = (),
+    dedup: PageDeduper | None = None,
+) -> Iterator[list[tuple[list[list[float]], str, float]]]:
+    """OCRs images concurrently on the shared pool, yielding results in input order.
+
+    Pages matching one of `layouts` skip text detection, see `ocr_page`. With
+    `dedup`, pages repeating earlier ones are not OCR'd and yield no result
+    (`dedup.kept` maps results back to images). Stopping iteration early
+    cancels the images that have not been started yet.
+    """
+    max_concurrency = request_concurrency(images, max_concurrency)
+    if dedup is not None:
+        images = dedup.filter(images)
+    return ocr_pool.imap(ocr_page, images, ocr_engine, layouts, max_concurrency=max_concurrency)
 
 
 def ocr_images_b64(
     images_b64: list[str],
     ocr_engine: str = "rapidocr",
+    max_concurrency: int | None = None,
+    layouts: Sequence[LayoutTemplate] = (),
+    dedup: PageDeduper | None = None,
 ) -> list[list[tuple[list[list[float]], str, float]]]:
-    images = decode_images_from_b64(images_b64)
-    out = []
-    for img in images:
-        out.append(ocr_image(img, ocr_engine))
-    return out
+    images = LazyImages.from_b64(images_b64)
+    return list(ocr_images_iter(images, ocr_engine, max_concurrency, layouts, dedup))
 
@@ -0,0 +1,191 @@
+import importlib.metadata
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Any, Callable
+
+from ort_settings import new_rapidocr
+
+if TYPE_CHECKING:
+    from rapidocr_onnxruntime import RapidOCR
+
+
+OCR_BATCHING = os.environ.get("OCR_BATCHING", "0") == "1"
+OCR_BATCH_MAX_SIZE = int(os.environ.get("OCR_BATCH_MAX_SIZE", 8))
+OCR_BATCH_MAX_WAIT_MS = float(os.environ.get("OCR_BATCH_MAX_WAIT_MS", 10))
+OCR_BATCH_WORKERS = int(os.environ.get("OCR_BATCH_WORKERS", 1))
+
+# Detection and recognition are run separately through these RapidOCR internals,
+# which only rapidocr_onnxruntime 1.4 is known to have; other versions OCR each
+# image with the public `RapidOCR.__call__` and only batch crops
+SPLIT_PIPELINE_VERSIONS = ("1.4.",)
+SPLIT_PIPELINE_METHODS = (
+    "load_img", "preprocess", "maybe_add_letterbox", "auto_text_det",
+    "get_crop_img_list", "_get_origin_points", "get_final_res",
+)
+
+logger = logging.getLogger(__name__)
+
+
+class OCRBatcher:
+    """Collects OCR work from concurrent callers and runs it as batched engine calls.
+
+    Callers submit whole images (`submit_image`) or already cropped text lines
+    (`submit_crops`) and get a Future back. Each worker thread owns a RapidOCR
+    instance and repeatedly takes up to `max_batch_size` queued items, waiting at
+    most `max_wait_ms` after the first one for more to arrive. Text detection
+    runs per image, since pages differ in size, but the angle classifier and the
+    recognizer run once over the crops of every item in the batch, so ONNX
+    Runtime sees full recognition batches instead of a few lines at a time.
+
+    Image results use the `(detections, elapse)` shape RapidOCR returns; crop
+    results are lists of `(text, confidence)`. With a RapidOCR version whose
+    internals `splits_pipeline` does not recognise, images are OCR'd one at a
+    time and only crops are batched.
+    """
+
+    def __init__(
+        self,
+        max_batch_size: int = OCR_BATCH_MAX_SIZE,
+        max_wait_ms: float = OCR_BATCH_MAX_WAIT_MS,
+        workers: int = OCR_BATCH_WORKERS,
+        reader_factory: Callable[[], "RapidOCR"] | None = None,
+    ):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.workers = max(1, workers)
+        self._reader_factory = reader_factory
+        self._queue: queue.Queue = queue.Queue()
+        self._threads: list[threading.Thread] = []
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+
+    def submit_image(self, img: Any) -> Future:
+        return self._submit("image", img)
+
+    def submit_crops(self, crops: list[Any]) -> Future:
+        return self._submit("crops", crops)
+
+    def _submit(self, kind: str, payload: Any) -> Future:
+        self._start()
+        future: Future = Future()
+        self._queue.put((kind, payload, future))
+        return future
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"ocr-batcher-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _collect(self) -> list[tuple[str, Any, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self) -> None:
+        reader = (self._reader_factory or _new_reader)()
+        split = splits_pipeline(reader)
+        if not split:
+            logger.warning("OCR batching only batches crops with this rapidocr_onnxruntime version")
+        while True:
+            batch = self._collect()
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+            self._run_batch(reader, batch, split)
+
+    def _run_batch(self, reader: "RapidOCR", batch: list[tuple[str, Any, Future]], split: bool = True) -> None:
+        all_crops: list[Any] = []
+        planned = []
+        for kind, payload, future in batch:
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if kind == "image" and not split:
+                    future.set_result(reader(payload))
+                    continue
+                if kind == "image":
+                    start = time.perf_counter()
+                    detection = _detect(reader, payload)
+                    det_elapse = time.perf_counter() - start
+                    crops = detection[0] if detection is not None else []
+                else:
+                    detection = None
+                    det_elapse = 0.0
+                    crops = list(payload)
+            except Exception as exc:
+                future.set_exception(exc)
+                continue
+            planned.append((kind, detection, det_elapse, future, len(all_crops), len(crops)))
+            all_crops.extend(crops)
+
+        # Every item waits for the whole batch's classifier and recognizer calls
+        cls_elapse = rec_elapse = 0.0
+        try:
+            rec_res = []
+            if all_crops:
+                if reader.use_cls:
+                    all_crops, _, cls_elapse = reader.text_cls(all_crops)
+                rec_res, rec_elapse = reader.text_rec(all_crops)
+        except Exception as exc:
+            for _, _, _, future, _, _ in planned:
+                future.set_exception(exc)
+            return
+
+        for kind, detection, det_elapse, future, start, count in planned:
+            item_res = rec_res[start:start + count]
+            if kind == "crops":
+                future.set_result([(res[0], res[1]) for res in item_res])
+            elif detection is None:
+                future.set_result((None, None))
+            else:
+                _, dt_boxes, op_record, raw_h, raw_w = detection
+                dt_boxes = reader._get_origin_points(dt_boxes, op_record, raw_h, raw_w)
+                future.set_result(reader.get_final_res(dt_boxes, None, item_res, det_elapse, cls_elapse, rec_elapse))
+
+
+def splits_pipeline(reader: "RapidOCR") -> bool:
+    """Whether `reader` has the RapidOCR internals `_detect` and `_run_batch` use."""
+    try:
+        version = importlib.metadata.version("rapidocr_onnxruntime")
+    except importlib.metadata.PackageNotFoundError:
+        return False
+    return version.startswith(SPLIT_PIPELINE_VERSIONS) and all(hasattr(reader, name) for name in SPLIT_PIPELINE_METHODS)
+
+
+def _new_reader() -> "RapidOCR":
+    return new_rapidocr()
+
+
+def _detect(reader: "RapidOCR", img: Any):
+    """The detection half of `RapidOCR.__call__`: returns the text line crops and
+    what is needed to map their boxes back, or None when no text was found."""
+    img = reader.load_img(img)
+    raw_h, raw_w = img.shape[:2]
+    op_record: dict[str, Any] = {}
+    img, ratio_h, ratio_w = reader.preprocess(img)
+    op_record["preprocess"] = {"ratio_h": ratio_h, "ratio_w": ratio_w}
+    img, op_record = reader.maybe_add_letterbox(img, op_record)
+    dt_boxes, _ = reader.auto_text_det(img)
+    if dt_boxes is None:
+        return None
+    return reader.get_crop_img_list(img, dt_boxes), dt_boxes, op_record, raw_h, raw_w
+
+
+ocr_batcher = OCRBatcher() if OCR_BATCHING else None
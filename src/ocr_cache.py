@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Any
+
+
+OCR_CACHE_MAX_BYTES = int(os.environ.get("OCR_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+OCR_CACHE_DIR = os.environ.get("OCR_CACHE_DIR") or None
+
+OCRResult = list[tuple[list[list[float]], str, float]]
+
+
+class OCRCache:
+    """Content-addressed cache of normalized OCR results.
+
+    Entries are keyed by a hash of the decoded image pixels plus the engine name.
+    The memory tier is an LRU bounded by `max_bytes` (the size of each entry's
+    JSON encoding); 0 disables it. When `directory` is set, entries are also
+    written there as JSON files, so they survive restarts and are shared by every
+    worker on the node. Counters are per process.
+    """
+
+    def __init__(self, max_bytes: int = OCR_CACHE_MAX_BYTES, directory: str | None = OCR_CACHE_DIR):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self._entries: OrderedDict[str, tuple[OCRResult, int]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 or bool(self.directory)
+
+    @staticmethod
+    def key_for(img: Any, ocr_engine: str) -> str:
+        h = hashlib.blake2b(digest_size=20)
+        h.update(ocr_engine.encode())
+        h.update(f"{img.shape}{img.dtype}".encode())
+        h.update(img if img.flags.c_contiguous else img.copy())
+        return h.hexdigest()
+
+    def get(self, key: str) -> OCRResult | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(entry[0])
+
+        payload = self._read_disk(key)
+        if payload is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        value = _decode(payload)
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, value, len(payload))
+        return list(value)
+
+    def put(self, key: str, value: OCRResult) -> None:
+        payload = json.dumps(value).encode()
+        with self._lock:
+            self._remember(key, value, len(payload))
+        self._write_disk(key, payload)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _remember(self, key: str, value: OCRResult, size: int) -> None:
+        # Caller holds the lock
+        if size > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _read_disk(self, key: str) -> bytes | None:
+        if not self.directory:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_disk(self, key: str, payload: bytes) -> None:
+        if not self.directory:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so other workers never read a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+def _decode(payload: bytes) -> OCRResult:
+    return [(bbox, text, confidence) for bbox, text, confidence in json.loads(payload)]
+
+
+ocr_cache = OCRCache()
@@ -0,0 +1,106 @@
+import contextvars
+import os
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator
+
+
+OCR_POOL_BACKEND = os.environ.get("OCR_POOL_BACKEND", "thread")
+OCR_POOL_SIZE = int(os.environ.get("OCR_POOL_SIZE", os.cpu_count() or 1))
+OCR_MAX_CONCURRENCY_PER_REQUEST = int(os.environ.get("OCR_MAX_CONCURRENCY_PER_REQUEST", OCR_POOL_SIZE))
+
+
+class OCRPool:
+    """A bounded pool of OCR workers, each holding its own engine instance.
+
+    `size` caps how many images are OCR'd at once in this process, and
+    `max_per_request` caps how many of those a single `imap` call may occupy.
+    Workers are threads or processes depending on `backend`; `initializer` is
+    run once per worker and is where engine instances should be created.
+    """
+
+    def __init__(
+        self,
+        size: int = OCR_POOL_SIZE,
+        backend: str = OCR_POOL_BACKEND,
+        max_per_request: int = OCR_MAX_CONCURRENCY_PER_REQUEST,
+        initializer: Callable[[], None] | None = None,
+    ):
+        if backend not in ("thread", "process"):
+            raise ValueError(f"Unknown OCR pool backend: {backend}")
+        self.size = max(1, size)
+        self.backend = backend
+        self.max_per_request = max(1, min(max_per_request, self.size))
+        self._initializer = initializer
+        self._executor: Executor | None = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.backend == "process":
+                    self._executor = ProcessPoolExecutor(self.size, initializer=self._initializer)
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        self.size, thread_name_prefix="ocr", initializer=self._initializer
+                    )
+            return self._executor
+
+    def reconfigure(self, size: int, backend: str) -> None:
+        """Changes the pool's size and backend; only possible before its workers start."""
+        if backend not in ("thread", "process"):
+            raise ValueError(f"Unknown OCR pool backend: {backend}")
+        with self._lock:
+            if self._executor is not None:
+                raise RuntimeError("the OCR pool has already started its workers.")
+            self.size = max(1, size)
+            self.backend = backend
+            self.max_per_request = min(self.max_per_request, self.size)
+
+    def submit(self, fn: Callable[..., Any], *args: Any) -> Future:
+        return self._submit(self._get_executor(), fn, *args)
+
+    def _submit(self, executor: Executor, fn: Callable[..., Any], *args: Any) -> Future:
+        if self.backend == "thread":
+            # Run in a copy of the caller's context, so context variables (e.g. the
+            # request's stage timings) are visible to the worker
+            return executor.submit(contextvars.copy_context().run, fn, *args)
+        return executor.submit(fn, *args)
+
+    def imap(
+        self,
+        fn: Callable[..., Any],
+        items: Iterable[Any],
+        *args: Any,
+        max_concurrency: int | None = None,
+    ) -> Iterator[Any]:
+        """Yields `fn(item, *args)` for each item, in input order.
+
+        At most `max_concurrency` items (default `max_per_request`) are in flight
+        at any time. Closing the generator early (e.g. breaking out of the loop)
+        cancels every submitted item that has not started yet.
+        """
+        limit = min(max_concurrency or self.max_per_request, self.max_per_request)
+        executor = self._get_executor()
+        pending: deque[Future] = deque()
+        items_iter = iter(items)
+        try:
+            for item in items_iter:
+                pending.append(self._submit(executor, fn, item, *args))
+                if len(pending) >= limit:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def map(self, fn: Callable[..., Any], items: Iterable[Any], *args: Any, max_concurrency: int | None = None) -> list[Any]:
+        return list(self.imap(fn, items, *args, max_concurrency=max_concurrency))
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+from typing import TYPE_CHECKING, Any, Mapping
+
+if TYPE_CHECKING:
+    from rapidocr_onnxruntime import RapidOCR
+
+# ONNX Runtime session settings for the RapidOCR models. RapidOCR builds its sessions
+# with fixed options (a thread per core, no memory arena), so several OCR workers on
+# one host oversubscribe the cores. Settings come from ORT_SETTINGS_FILE (JSON, e.g.
+# written by benchmarks/ort_autotune.py) and the ORT_* variables below, which take
+# precedence. The file may also hold "det", "cls" and "rec" sections for one model.
+ORT_SETTINGS_FILE = os.environ.get("ORT_SETTINGS_FILE", "")
+# Directory of replacement models named det.onnx, cls.onnx and rec.onnx, e.g. the INT8
+# models written by benchmarks/quantize_models.py; models missing from it stay the
+# ones shipped with RapidOCR
+OCR_MODEL_DIR = os.environ.get("OCR_MODEL_DIR", "")
+
+MODELS = ("det", "cls", "rec")
+# RapidOCR's own choices; 0 threads leaves the count to ONNX Runtime (one per core)
+DEFAULT_SETTINGS: dict[str, Any] = {
+    "intra_op_threads": 0,
+    "inter_op_threads": 0,
+    "execution_mode": "sequential",
+    "graph_optimization": "all",
+    "cpu_mem_arena": False,
+    "allow_spinning": True,
+    # Cores intra-op threads are pinned to, in ONNX Runtime's syntax ("1;2;3", one
+    # entry per thread but the first), or empty to leave them to the OS
+    "thread_affinity": "",
+}
+EXECUTION_MODES = ("sequential", "parallel")
+GRAPH_OPTIMIZATIONS = ("disabled", "basic", "extended", "all")
+
+
+def _parse(key: str, value: Any) -> Any:
+    if key not in DEFAULT_SETTINGS:
+        raise ValueError(f"unknown ONNX Runtime setting {key!r}.")
+    default = DEFAULT_SETTINGS[key]
+    if isinstance(default, bool):
+        if isinstance(value, str):
+            return value.lower() in ("1", "true", "yes")
+        return bool(value)
+    if isinstance(default, int):
+        value = int(value)
+        if value < 0:
+            raise ValueError(f"ONNX Runtime setting {key} must be 0 or more, got {value}.")
+        return value
+    value = str(value)
+    choices = {"execution_mode": EXECUTION_MODES, "graph_optimization": GRAPH_OPTIMIZATIONS}.get(key)
+    if choices is not None and value not in choices:
+        raise ValueError(f"ONNX Runtime setting {key} must be one of {', '.join(choices)}, got {value!r}.")
+    return value
+
+
+def load_settings(path: str = ORT_SETTINGS_FILE, environ: Mapping[str, str] = os.environ) -> dict[str, dict[str, Any]]:
+    """The settings of each model ("det", "cls", "rec"): defaults, then the file at
+    `path`, then ORT_<SETTING> variables (e.g. ORT_INTRA_OP_THREADS).
+
+    Raises ValueError for unknown settings or invalid values.
+    """
+    shared: dict[str, Any] = {}
+    per_model: dict[str, dict[str, Any]] = {model: {} for model in MODELS}
+    if path:
+        with open(path) as f:
+            data = json.load(f)
+        for key, value in data.items():
+            if key in MODELS:
+                per_model[key].update({k: _parse(k, v) for k, v in value.items()})
+            else:
+                shared[key] = _parse(key, value)
+    for key in DEFAULT_SETTINGS:
+        value = environ.get(f"ORT_{key.upper()}")
+        if value is not None:
+            shared[key] = _parse(key, value)
+            for model in MODELS:
+                per_model[model].pop(key, None)
+    return {model: {**DEFAULT_SETTINGS, **shared, **per_model[model]} for model in MODELS}
+
+
+def session_options(settings: Mapping[str, Any]) -> Any:
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.log_severity_level = 4
+    options.intra_op_num_threads = settings["intra_op_threads"]
+    options.inter_op_num_threads = settings["inter_op_threads"]
+    options.execution_mode = (
+        ort.ExecutionMode.ORT_PARALLEL if settings["execution_mode"] == "parallel" else ort.ExecutionMode.ORT_SEQUENTIAL
+    )
+    options.graph_optimization_level = {
+        "disabled": ort.GraphOptimizationLevel.ORT_DISABLE_ALL,
+        "basic": ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+        "extended": ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+        "all": ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+    }[settings["graph_optimization"]]
+    options.enable_cpu_mem_arena = settings["cpu_mem_arena"]
+    spinning = "1" if settings["allow_spinning"] else "0"
+    options.add_session_config_entry("session.intra_op.allow_spinning", spinning)
+    options.add_session_config_entry("session.inter_op.allow_spinning", spinning)
+    if settings["thread_affinity"]:
+        options.add_session_config_entry("session.intra_op_thread_affinities", settings["thread_affinity"])
+    return options
+
+
+def model_paths(directory: str = OCR_MODEL_DIR) -> dict[str, str]:
+    """The RapidOCR `<model>_model_path` options for the models found in `directory`."""
+    if not directory:
+        return {}
+    if not os.path.isdir(directory):
+        raise ValueError(f"OCR model directory {directory!r} does not exist.")
+    paths = {model: os.path.join(directory, f"{model}.onnx") for model in MODELS}
+    return {f"{model}_model_path": path for model, path in paths.items() if os.path.isfile(path)}
+
+
+def shipped_model_paths() -> dict[str, str]:
+    """The model file of each model ("det", "cls", "rec") RapidOCR loads by default,
+    from the config.yaml shipped with it."""
+    import rapidocr_onnxruntime
+    import yaml
+
+    root = os.path.dirname(rapidocr_onnxruntime.__file__)
+    with open(os.path.join(root, "config.yaml")) as f:
+        config = yaml.safe_load(f)
+    return {model: os.path.join(root, config[model.capitalize()]["model_path"]) for model in MODELS}
+
+
+def _session_holders(reader: "RapidOCR") -> dict[str, Any]:
+    return {"det": reader.text_det.infer, "cls": reader.text_cls.infer, "rec": reader.text_rec.session}
+
+
+def configure_sessions(
+    reader: "RapidOCR", settings: Mapping[str, Mapping[str, Any]], paths: Mapping[str, str]
+) -> None:
+    """Rebuilds the detection, classification and recognition sessions of `reader`
+    with `settings` (from `load_settings`), keeping their providers. `paths` are the
+    model files `reader` was built with; its sessions do not say."""
+    import onnxruntime as ort
+
+    for model, holder in _session_holders(reader).items():
+        if settings[model] == DEFAULT_SETTINGS:
+            continue
+        session = holder.session
+        providers = session.get_providers()
+        provider_options = session.get_provider_options()
+        holder.session = ort.InferenceSession(
+            paths[model],
+            sess_options=session_options(settings[model]),
+            providers=providers,
+            provider_options=[provider_options.get(p, {}) for p in providers],
+        )
+
+
+def models_cache_tag(directory: str = OCR_MODEL_DIR) -> str:
+    """A suffix for OCR cache keys that tells results of the replacement models in
+    `directory` apart from the shipped models' and from other replacements, even
+    when a directory is rewritten with differently quantized models."""
+    paths = model_paths(directory)
+    if not paths:
+        return ""
+    h = hashlib.blake2b(digest_size=8)
+    for option, path in sorted(paths.items()):
+        h.update(option.encode())
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return f"@{h.hexdigest()}"
+
+
+ort_settings = load_settings()
+MODELS_CACHE_TAG = models_cache_tag()
+
+
+def new_rapidocr(settings: Mapping[str, Mapping[str, Any]] | None = None, **options: Any) -> "RapidOCR":
+    """A RapidOCR engine with RapidOCR `options`, its sessions built with `settings`
+    (default: `ort_settings`) and the models in `OCR_MODEL_DIR`, if set. An
+    `intra_op_num_threads` option wins over the settings."""
+    from rapidocr_onnxruntime import RapidOCR
+
+    settings = settings or ort_settings
+    if "intra_op_num_threads" in options:
+        # Applied by configure_sessions only: RapidOCR would build its sessions with it too
+        threads = options.pop("intra_op_num_threads")
+        settings = {model: {**settings[model], "intra_op_threads": threads} for model in MODELS}
+    options = {**model_paths(), **options}
+    reader = RapidOCR(**options)
+    if any(settings[model] != DEFAULT_SETTINGS for model in MODELS):
+        paths = shipped_model_paths()
+        paths.update({model: options[f"{model}_model_path"] for model in MODELS if f"{model}_model_path" in options})
+        configure_sessions(reader, settings, paths)
+    return reader
@@ -0,0 +1,89 @@
+import logging
+import os
+import signal
+import socket
+import sys
+from typing import Any
+
+import uvicorn
+
+from ocr import ocr_pool, preload, warm_up
+
+
+logger = logging.getLogger(__name__)
+
+
+def serve(app: Any, host: str, port: int, workers: int) -> None:
+    """Runs `workers` uvicorn workers forked from one parent that has already loaded
+    and warmed the OCR engines.
+
+    Forked workers share the engines' memory copy-on-write, and start answering
+    requests without loading a model. The engines are built with one intra-op
+    thread, since ONNX Runtime thread pools do not survive a fork (and with one
+    worker per core they would only compete with each other). Each worker's
+    OCR pool is a single thread using those engines, whatever `OCR_POOL_SIZE`
+    and `OCR_POOL_BACKEND` say: a larger pool would build engines of its own.
+    Workers that exit unexpectedly are replaced. POSIX only.
+    """
+    if not hasattr(os, "fork"):
+        raise RuntimeError("pre-fork mode needs os.fork, which this platform does not have.")
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    if ocr_pool.size != 1 or ocr_pool.backend != "thread":
+        logger.warning(
+            "pre-fork workers OCR on one thread each; ignoring OCR_POOL_SIZE=%d and OCR_POOL_BACKEND=%s",
+            ocr_pool.size, ocr_pool.backend,
+        )
+        ocr_pool.reconfigure(1, "thread")
+    # Only engines are built before forking: the OCR pool's thread starts in each worker
+    preload(intra_op_num_threads=1)
+    warm_up(pool=False)
+
+    children: set[int] = set()
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    for _ in range(workers):
+        children.add(_fork_worker(app, sock))
+    logger.info("pre-fork server on %s:%d with %d workers", host, port, workers)
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        children.discard(pid)
+        if not stopping:
+            logger.warning("worker %d exited with status %d, starting a new one", pid, status)
+            children.add(_fork_worker(app, sock))
+    sock.close()
+
+
+def _fork_worker(app: Any, sock: socket.socket) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    # The parent warmed the engines this worker inherited; its lifespan skips warm_up
+    app.state.ocr_warmed = True
+    try:
+        uvicorn.Server(uvicorn.Config(app)).run(sockets=[sock])
+    finally:
+        sys.stdout.flush()
+        os._exit(0)
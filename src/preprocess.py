@@ -0,0 +1,93 @@
+import os
+from typing import Any
+
+import cv2
+import numpy as np
+
+
+# Height in pixels that text lines are scaled to before OCR; 0 keeps pages at their
+# decoded size. Pages are only ever scaled down.
+OCR_TARGET_TEXT_HEIGHT = float(os.environ.get("OCR_TARGET_TEXT_HEIGHT", 0))
+OCR_GRAYSCALE = os.environ.get("OCR_GRAYSCALE", "0") == "1"
+
+# The game UI scales with the screen width, so the height of a line of text is a
+# fixed fraction of the page width (median detected box height over the bundled
+# phone and tablet screenshots).
+TEXT_HEIGHT_PER_WIDTH = 0.035
+
+# Power-of-two downscales OpenCV can apply while decoding (cheap for JPEG).
+_REDUCED_DECODE_FLAGS = {
+    False: {1: cv2.IMREAD_COLOR, 2: cv2.IMREAD_REDUCED_COLOR_2, 4: cv2.IMREAD_REDUCED_COLOR_4, 8: cv2.IMREAD_REDUCED_COLOR_8},
+    True: {1: cv2.IMREAD_GRAYSCALE, 2: cv2.IMREAD_REDUCED_GRAYSCALE_2, 4: cv2.IMREAD_REDUCED_GRAYSCALE_4, 8: cv2.IMREAD_REDUCED_GRAYSCALE_8},
+}
+
+
+class ScaledImage(np.ndarray):
+    """A page that may be smaller than the screenshot it came from.
+
+    `scale` converts its pixel coordinates back to the original screenshot's, and
+    is kept by slices (e.g. the header strip) and across process boundaries.
+    """
+
+    scale: float
+
+    def __array_finalize__(self, obj: Any) -> None:
+        self.scale = getattr(obj, "scale", 1.0)
+
+    def __reduce__(self):
+        fn, args, state = super().__reduce__()
+        return fn, args, (state, self.scale)
+
+    def __setstate__(self, state: Any) -> None:
+        super().__setstate__(state[0])
+        self.scale = state[1]
+
+
+def target_scale(width: int, target_text_height: float = OCR_TARGET_TEXT_HEIGHT) -> float:
+    """Factor a page `width` pixels wide is resized by to reach the target text height."""
+    if target_text_height <= 0:
+        return 1.0
+    return min(1.0, target_text_height / (width * TEXT_HEIGHT_PER_WIDTH))
+
+
+def reduced_decode(scale: float, grayscale: bool = OCR_GRAYSCALE) -> tuple[int, int]:
+    """Picks the largest decode-time reduction that stays at or above `scale`.
+
+    Returns the `cv2.imdecode` flag and the reduction factor.
+    """
+    factor = max(f for f in (1, 2, 4, 8) if f * scale <= 1.0)
+    return _REDUCED_DECODE_FLAGS[grayscale][factor], factor
+
+
+def prepare_image(
+    img: Any,
+    target_text_height: float = OCR_TARGET_TEXT_HEIGHT,
+    grayscale: bool = OCR_GRAYSCALE,
+    original_width: int | None = None,
+) -> ScaledImage:
+    """Resizes a decoded page to the target text height and optionally drops colour.
+
+    `original_width` is the width of the screenshot when `img` was already
+    decoded at reduced resolution; the result's `scale` maps back to it.
+    """
+    height, width = img.shape[:2]
+    original_width = original_width or width
+    new_width = max(1, round(original_width * target_scale(original_width, target_text_height)))
+    if new_width < width:
+        new_height = max(1, round(height * new_width / width))
+        img = cv2.resize(img, (new_width, new_height), interpolation=cv2.INTER_AREA)
+    if grayscale and img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    prepared = img.view(ScaledImage)
+    prepared.scale = original_width / img.shape[1]
+    return prepared
+
+
+def scale_boxes(
+    results: list[tuple[list[list[float]], str, float]],
+    scale: float,
+) -> list[tuple[list[list[float]], str, float]]:
+    """Maps OCR bounding boxes from a prepared page back to original coordinates."""
+    if scale == 1.0:
+        return results
+    return [([[x * scale, y * scale] for x, y in bbox], text, confidence) for bbox, text, confidence in results]
@@ -19,6 +19,8 @@ from .outputs import (
     BattleOutcome,
     BonusOverviewOutput,
     BattleReportOutput,
+    OCRCacheStats,
+    JobStatus,
 )
 
 from .errors import (
@@ -37,6 +39,8 @@ __all__ = [
     "BattleOutcome",
     "BonusOverviewOutput",
     "BattleReportOutput",
+    "OCRCacheStats",
+    "JobStatus",
     # errors
     "ErrorResponse",
 ]
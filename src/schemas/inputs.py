@@ -8,7 +8,7 @@ class ImageData(BaseModel):
 
 class ReadStatsRequest(BaseModel):
     images: List[ImageData] = Field(..., description="List of base64 encoded images")
-    ocr_engine: str = Field(default="rapidocr", description="OCR engine to use (easyocr has been deprecated)")
+    ocr_engine: str = Field(default="rapidocr", description="OCR engine to use: rapidocr, rapidocr_lite, easyocr, tesseract, or fastest / most_accurate to pick from the measured engine profiles")
 
 
 class ReadStatsFromReportRequest(ReadStatsRequest):
@@ -16,5 +16,6 @@ class ReadStatsFromReportRequest(ReadStatsRequest):
 
 
 class ReadStatsFromBonusOverviewRequest(ReadStatsRequest):
-    pass
+    fuzzy_keys: bool = Field(default=False, description="Whether to match stat labels misread by one character")
+    early_exit: bool = Field(default=False, description="Whether to stop OCR once every stat has been read, skipping the remaining images")
 
@@ -1,6 +1,8 @@
-from typing import Dict, List
+from typing import Dict, List, Literal, Optional
 from pydantic import BaseModel, Field
 
+from .errors import ErrorResponse
+
 
 class Stats(BaseModel):
     infantry: List[float] = Field(default=[0.0, 0.0, 0.0, 0.0], description="Infantry stats [attack, defense, lethality, health]")
@@ -51,10 +53,11 @@ class BattleOutcome(BaseModel):
 
 class BonusOverviewOutput(BaseModel):
     stats: Stats = Field(..., description="Stats by troop type")
+    skipped_images: Optional[List[int]] = Field(default=None, description="Indices of images skipped once every stat was read (early_exit only)")
 
     @classmethod
-    def from_stats_dict(cls, stats: Dict[str, List[float]]) -> "BonusOverviewOutput":
-        return cls(stats=Stats.from_dict(stats))
+    def from_stats_dict(cls, stats: Dict[str, List[float]], skipped_images: Optional[List[int]] = None) -> "BonusOverviewOutput":
+        return cls(stats=Stats.from_dict(stats), skipped_images=skipped_images)
 
 
 class BattleReportOutput(BaseModel):
@@ -62,3 +65,24 @@ class BattleReportOutput(BaseModel):
     left_stats: Stats = Field(..., description="Left side stats by troop type")
     right_stats: Stats = Field(..., description="Right side stats by troop type")
 
+
+class OCRCacheStats(BaseModel):
+    hits: int = Field(..., description="Lookups answered from the in-memory tier")
+    disk_hits: int = Field(..., description="Lookups answered from the on-disk tier")
+    misses: int = Field(..., description="Lookups that had to run OCR")
+    evictions: int = Field(..., description="Entries evicted from the in-memory tier")
+    entries: int = Field(..., description="Entries currently held in memory")
+    bytes: int = Field(..., description="Bytes currently held in memory")
+    max_bytes: int = Field(..., description="In-memory byte budget")
+
+
+class JobStatus(BaseModel):
+    id: str = Field(..., description="Job id")
+    kind: Literal["battle_report", "bonus_overview"] = Field(..., description="Parser the job runs")
+    status: Literal["queued", "running", "done", "failed"] = Field(..., description="Current state of the job")
+    attempts: int = Field(default=0, description="How many times a worker started the job")
+    created_at: float = Field(..., description="Submission time (Unix seconds)")
+    started_at: Optional[float] = Field(default=None, description="When the last attempt started (Unix seconds)")
+    finished_at: Optional[float] = Field(default=None, description="When the job finished (Unix seconds)")
+    result: BattleReportOutput | BonusOverviewOutput | None = Field(default=None, description="Parser output once the job is done")
+    error: Optional[ErrorResponse] = Field(default=None, description="Error once the job has failed")
@@ -0,0 +1,164 @@
+import os
+from typing import Any, Iterable, Iterator
+
+import cv2
+import numpy as np
+
+from layout import find_cells
+from metrics import STITCHED_ROWS
+from timings import timed
+
+# Overlapping screenshots of one table (bonus overview scroll positions) are cut into
+# their text rows, rows already seen on an earlier screenshot are dropped, and the rest
+# are pasted onto one tall canvas that is OCR'd once. Screenshots may differ in size
+# and crop; rows are registered by their text, not by pixel position.
+STITCH_PAGES = os.environ.get("STITCH_PAGES", "1") == "1"
+
+# Rows are compared by their label cells and their value cell separately, each as a
+# normalized grayscale band of this size (width, height)
+LABEL_DESCRIPTOR_SIZE = (288, 16)
+VALUE_DESCRIPTOR_SIZE = (96, 16)
+# Lowest correlation of two descriptors that counts as the same; a row is only
+# dropped when both its label and its value score this against one earlier row.
+# The same row on two screenshots scores above 0.97, different rows below 0.75.
+SAME_ROW_SCORE = 0.95
+# Rows whose last cell is much shorter than the page's usual are cut off by the
+# screen edge and left to another screenshot
+MIN_ROW_HEIGHT = 0.75
+# A canvas is closed once it is this many times as tall as it is wide
+MAX_CANVAS_ASPECT = 2.5
+
+
+class Row:
+    """A text row of a page: its band of pixels (with some background around the
+    text) and the label and value descriptors it is matched by. Rows without a
+    label cell have an empty label descriptor."""
+
+    def __init__(self, band: np.ndarray, left: int, label: np.ndarray, value: np.ndarray):
+        self.band = band
+        self.left = left
+        self.label = label
+        self.value = value
+
+
+def _descriptor(strip: np.ndarray, size: tuple[int, int]) -> np.ndarray:
+    descriptor = cv2.resize(strip, size, interpolation=cv2.INTER_AREA).astype(np.float32).ravel()
+    descriptor -= descriptor.mean()
+    descriptor /= np.linalg.norm(descriptor) or 1.0
+    return descriptor
+
+
+def page_rows(img: Any) -> tuple[list[Row], float] | None:
+    """Cuts a page into its text rows (see `layout.find_cells`).
+
+    Returns the rows and the page's text span (from the first cell of a row to
+    the last, the median over rows with several cells), which scales pages
+    against each other. Returns None when the page has no table rows.
+    """
+    cells = find_cells(img)
+    table = [row for row in cells if len(row) > 1]
+    if not table:
+        return None
+    span = float(np.median([row[-1][2] - row[0][0] for row in table]))
+    # Value cells (digits, "%") have no descenders, so their height is the same on every row
+    line = float(np.median([row[-1][3] - row[-1][1] for row in table]))
+    gray = img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    height, width = gray.shape
+    rows = []
+    for i, row in enumerate(cells):
+        left, right = row[0][0], row[-1][2]
+        top, bottom = min(cell[1] for cell in row), max(cell[3] for cell in row)
+        value_top, value_bottom = row[-1][1], row[-1][3]
+        if value_bottom - value_top < line * MIN_ROW_HEIGHT or top <= 0 or bottom >= height:
+            continue
+        # Descriptors are anchored on the last cell, whose bounds do not depend on descenders
+        pad = (value_bottom - value_top) * 3 // 10
+        strip = gray[max(0, value_top - pad):value_bottom + pad]
+        value = _descriptor(strip[:, row[-1][0]:right], VALUE_DESCRIPTOR_SIZE)
+        label = _descriptor(strip[:, left:row[-2][2]], LABEL_DESCRIPTOR_SIZE) if len(row) > 1 else np.zeros(0, np.float32)
+        # Bands reach halfway to the neighbouring rows, at most a line
+        above = cells[i - 1][0][3] if i else 0
+        below = cells[i + 1][0][1] if i + 1 < len(cells) else height
+        band_top = max(top - int(line), (above + top) // 2)
+        band_bottom = min(bottom + int(line), (bottom + below + 1) // 2)
+        margin = int(line)
+        band_left = max(0, left - margin)
+        # A copy, so canvases do not keep the whole decoded page alive until they are rendered
+        band = img[band_top:band_bottom, band_left:min(width, right + margin)].copy()
+        rows.append(Row(band, band_left - left, label, value))
+    return rows, span
+
+
+class Canvas:
+    """Unique rows pasted one under the other at the first page's scale."""
+
+    def __init__(self, width: int, left: int, span: float):
+        self.width = width
+        self.left = left
+        self.span = span
+        self.bands: list[tuple[np.ndarray, int]] = []
+        self.height = 0
+
+    def fits(self, band: np.ndarray) -> bool:
+        return not self.bands or self.height + band.shape[0] <= self.width * MAX_CANVAS_ASPECT
+
+    def add(self, band: np.ndarray, left: int) -> None:
+        self.bands.append((band, left))
+        self.height += band.shape[0]
+
+    def render(self) -> np.ndarray:
+        first = self.bands[0][0]
+        canvas = np.empty((self.height, self.width) + first.shape[2:], first.dtype)
+        y = 0
+        for band, left in self.bands:
+            # Fill around the band with its own background so no edges are drawn
+            canvas[y:y + band.shape[0]] = np.median(band[:, :2].reshape(-1, *band.shape[2:]), axis=0)
+            x = max(0, left)
+            visible = band[:, x - left:x - left + self.width - x]
+            canvas[y:y + band.shape[0], x:x + visible.shape[1]] = visible
+            y += band.shape[0]
+        return canvas
+
+
+def _same_row(row: Row, seen: tuple[np.ndarray, np.ndarray]) -> bool:
+    label, value = seen
+    if row.label.size != label.size or float(row.value @ value) < SAME_ROW_SCORE:
+        return False
+    return not label.size or float(row.label @ label) >= SAME_ROW_SCORE
+
+
+def stitch_pages(images: Iterable[Any]) -> Iterator[Any]:
+    """Yields canvases holding every distinct text row of `images` once.
+
+    The first page with table rows sets the scale; other pages are scaled so
+    their text span matches it. Pages without table rows are yielded as they
+    are, in their place.
+    """
+    canvas: Canvas | None = None
+    seen: list[tuple[np.ndarray, np.ndarray]] = []
+    for img in images:
+        with timed("stitch"):
+            found = page_rows(img)
+        if found is None:
+            yield img
+            continue
+        rows, span = found
+        if canvas is None:
+            canvas = Canvas(img.shape[1], int(img.shape[1] * 0.05), span)
+        scale = canvas.span / span
+        for row in rows:
+            if any(_same_row(row, other) for other in seen):
+                STITCHED_ROWS.labels("duplicate").inc()
+                continue
+            seen.append((row.label, row.value))
+            STITCHED_ROWS.labels("unique").inc()
+            band = row.band
+            if scale != 1.0:
+                size = (max(1, round(band.shape[1] * scale)), max(1, round(band.shape[0] * scale)))
+                band = cv2.resize(band, size, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_LINEAR)
+            if not canvas.fits(band):
+                yield canvas.render()
+                canvas = Canvas(canvas.width, canvas.left, canvas.span)
+            canvas.add(band, canvas.left + round(row.left * scale))
+    if canvas is not None and canvas.bands:
+        yield canvas.render()
@@ -0,0 +1,92 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, TypeVar
+
+from metrics import STAGE_SECONDS
+
+
+STAGES = ("decode", "dedup", "probe", "detect", "classify", "recognize", "match_glyphs", "stitch", "merge_boxes", "parse")
+
+
+class StageTimings:
+    """Seconds spent in each pipeline stage, summed over every image of a request.
+
+    Stages of images OCR'd concurrently overlap, so the sum can exceed the
+    request's wall-clock time.
+    """
+
+    def __init__(self):
+        self._seconds: dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._seconds[stage] = self._seconds.get(stage, 0.0) + seconds
+
+    def as_dict(self) -> dict[str, float]:
+        with self._lock:
+            return dict(self._seconds)
+
+
+_current: ContextVar[StageTimings | None] = ContextVar("stage_timings", default=None)
+
+
+@contextmanager
+def collect_timings() -> Iterator[StageTimings]:
+    """Collects the stage timings of everything run inside the block.
+
+    Work handed to the OCR thread pool is included (it runs in a copy of the
+    caller's context); work run in pool processes is not.
+    """
+    timings = StageTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+T = TypeVar("T")
+
+
+def iter_collecting(items: Iterator[T], timings: StageTimings) -> Iterator[T]:
+    """Yields from `items`, collecting the stage timings of each step into `timings`.
+
+    For generators that are resumed from different contexts (e.g. a streamed
+    response body, stepped on threadpool threads), where a `collect_timings`
+    block around them would not see their work.
+    """
+    while True:
+        token = _current.set(timings)
+        try:
+            item = next(items)
+        except StopIteration:
+            return
+        finally:
+            _current.reset(token)
+        yield item
+
+
+def record(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.labels(stage).observe(seconds)
+    timings = _current.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def record_ocr_elapse(elapse: list[float] | None) -> None:
+    """Records the (detect, classify, recognize) seconds RapidOCR returns with a result."""
+    if elapse and len(elapse) == 3:
+        for stage, seconds in zip(("detect", "classify", "recognize"), elapse):
+            record(stage, seconds)
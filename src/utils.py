@@ -1,4 +1,5 @@
-
+from bisect import bisect_left
+import re
 
 def are_in_same_row(bbox1, bbox2, y_tolerance_factor=0.1):
     # Get the average y-coordinate for each bbox
@@ -69,9 +70,93 @@ def merge_bboxes(data1, data2):
 
     return (merged_bbox, merged_text, merged_prob)
 
-def handle_split_boxes(results):
+def handle_split_boxes(results, y_tolerance_factor=0.2, x_overlap_tolerance=20):
     """Merges horizontally close bounding boxes that are in the same row.
 
+    Boxes are bucketed into rows by y-center and each row is swept once from left
+    to right, so this runs in O(n log n) instead of the O(n^2) per pass of
+    `handle_split_boxes_pairwise`, with the same merge rules and output order.
+
+    Args:
+        results (list): List of OCR results, each in the format (bbox, text, confidence).
+    """
+    entries = []
+    for i, (bbox, text, prob) in enumerate(results):
+        xs = [p[0] for p in bbox]
+        entries.append({
+            "first": i,
+            "data": (bbox, text, prob),
+            "y_center": (bbox[0][1] + bbox[2][1]) / 2,
+            "height": abs(bbox[2][1] - bbox[0][1]),
+            "left": min(xs),
+            "right": max(xs),
+        })
+
+    # Bucket into rows: consecutive y-centers closer than the row tolerance share a row
+    rows = []
+    row_height = 0.0
+    last_y = None
+    for entry in sorted(entries, key=lambda e: (e["y_center"], e["first"])):
+        if last_y is None or entry["y_center"] - last_y >= max(row_height, entry["height"]) * y_tolerance_factor:
+            rows.append([])
+            row_height = 0.0
+        rows[-1].append(entry)
+        row_height = max(row_height, entry["height"])
+        last_y = entry["y_center"]
+
+    merged = []
+    for row in rows:
+        # Sweep left to right; only groups whose right edge can still reach the
+        # current box stay active, which keeps each step close to constant time
+        active = []
+        for entry in sorted(row, key=lambda e: (e["left"], e["first"])):
+            active = [g for g in active if g["right"] + x_overlap_tolerance > entry["left"]]
+            group = _merge_into_row_group(active, entry, y_tolerance_factor, x_overlap_tolerance)
+            if group is None:
+                active.append(entry)
+                merged.append(entry)
+
+    merged = sorted((e for e in merged if not e.get("absorbed")), key=lambda e: e["first"])
+    return [e["data"] for e in merged]
+
+
+def _merge_into_row_group(active, entry, y_tolerance_factor, x_overlap_tolerance):
+    """Merges `entry` into the first active group it touches, then keeps merging that
+    group with any other active group it now touches. Returns the group, or None."""
+    def can_merge(a, b):
+        return are_in_same_row(a["data"][0], b["data"][0], y_tolerance_factor=y_tolerance_factor) and \
+            are_horizontally_close_and_touching(a["data"][0], b["data"][0], x_overlap_tolerance=x_overlap_tolerance)
+
+    def absorb(group, other):
+        group["data"] = merge_bboxes(group["data"], other["data"])
+        bbox = group["data"][0]
+        group["first"] = min(group["first"], other["first"])
+        group["y_center"] = (bbox[0][1] + bbox[2][1]) / 2
+        group["height"] = abs(bbox[2][1] - bbox[0][1])
+        group["left"] = bbox[0][0]
+        group["right"] = bbox[2][0]
+        other["absorbed"] = True
+
+    group = next((g for g in active if can_merge(g, entry)), None)
+    if group is None:
+        return None
+    absorb(group, entry)
+
+    merged_more = True
+    while merged_more:
+        merged_more = False
+        for other in active:
+            if other is not group and not other.get("absorbed") and can_merge(group, other):
+                absorb(group, other)
+                merged_more = True
+    active[:] = [g for g in active if not g.get("absorbed")]
+    return group
+
+
+def handle_split_boxes_pairwise(results):
+    """Original multi-pass implementation of `handle_split_boxes`, comparing every
+    pair of boxes on each pass. Kept as a reference for benchmarks.
+
     Args:
         results (list): List of OCR results, each in the format (bbox, text, confidence).
     """
@@ -118,3 +203,117 @@ def handle_split_boxes(results):
         current_results = temp_current_results
     # The final merged results are now in current_results (minus the index at the start)
     return [(r[1], r[2], r[3]) for r in current_results]
+
+
+# Characters OCR commonly confuses inside labels, folded before tolerant matching
+_CONFUSABLES = str.maketrans({"0": "o", "1": "l", "i": "l", "|": "l", "5": "s", "8": "b"})
+
+
+def normalize_text(text) -> str:
+    """Lowercases and strips text, as used for exact label matching."""
+    return str(text).strip().lower()
+
+
+def _fold_text(text: str) -> str:
+    return "".join(normalize_text(text).translate(_CONFUSABLES).split())
+
+
+def _deletes(text: str) -> set[str]:
+    return {text[:i] + text[i + 1:] for i in range(len(text))}
+
+
+class TextIndex:
+    """Index over the OCR results of one image for label lookups and y-proximity.
+
+    Normalized texts map to their entries for O(1) label lookups, and entries are
+    kept sorted by average y so the nearest neighbour of a label is found with
+    bisection. Tolerant lookups use a deletion-neighbourhood index (built on first
+    use) that finds labels within one edit, ignoring spaces and common confusions
+    such as "0"/"o" or "1"/"l", without scanning every entry.
+    """
+
+    def __init__(self, results):
+        self.entries = []
+        for order, (bbox, text, prob) in enumerate(results):
+            y_coords = [pt[1] for pt in bbox]
+            self.entries.append({
+                "order": order,
+                "avg_y": sum(y_coords) / len(y_coords),
+                "text": text,
+                "bbox": bbox,
+                "prob": prob,
+            })
+        self._by_text = {}
+        for entry in self.entries:
+            self._by_text.setdefault(normalize_text(entry["text"]), []).append(entry)
+        self._by_y = sorted(self.entries, key=lambda e: (e["avg_y"], e["order"]))
+        self._ys = [e["avg_y"] for e in self._by_y]
+        self._fuzzy = None
+
+    def find(self, label: str, fuzzy: bool = False):
+        """Returns the first entry whose text is `label` (case-insensitive), or None.
+
+        With `fuzzy`, falls back to the first entry within one edit of `label`.
+        """
+        matches = self._by_text.get(normalize_text(label))
+        if matches:
+            return matches[0]
+        if not fuzzy:
+            return None
+
+        if self._fuzzy is None:
+            self._fuzzy = {}
+            for entry in self.entries:
+                folded = _fold_text(entry["text"])
+                for variant in _deletes(folded) | {folded}:
+                    self._fuzzy.setdefault(variant, []).append(entry)
+        folded = _fold_text(label)
+        candidates = []
+        for variant in _deletes(folded) | {folded}:
+            candidates.extend(self._fuzzy.get(variant, []))
+        return min(candidates, key=lambda e: e["order"], default=None)
+
+    def nearest_by_y(self, y: float, exclude_text=None):
+        """Returns the entry whose average y is closest to `y`, skipping entries whose
+        text equals `exclude_text`. Ties go to the entry that came first in the results."""
+        best = None
+        best_key = None
+        start = bisect_left(self._ys, y)
+        for indices in (range(start - 1, -1, -1), range(start, len(self._by_y))):
+            for i in indices:
+                entry = self._by_y[i]
+                distance = abs(entry["avg_y"] - y)
+                if best_key is not None and distance > best_key[0]:
+                    break
+                if entry["text"] == exclude_text:
+                    continue
+                if best_key is None or (distance, entry["order"]) < best_key:
+                    best, best_key = entry, (distance, entry["order"])
+        return best
+
+
+def _trie_pattern(node: dict) -> str:
+    branches = [re.escape(ch) + _trie_pattern(child) for ch, child in sorted(node.items()) if ch != ""]
+    if not branches:
+        return ""
+    pattern = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+    if "" in node:
+        # A label ends here but longer labels continue: prefer the longest match
+        pattern = "(?:" + pattern + ")?"
+    return pattern
+
+
+def compile_label_pattern(labels) -> re.Pattern:
+    """Compiles lowercase labels into one regex shaped like a trie of the labels.
+
+    Labels sharing a prefix share one branch, so matching cost depends on the text
+    rather than on how many labels there are, and the longest label wins when one
+    label is a prefix of another.
+    """
+    trie: dict = {}
+    for label in labels:
+        node = trie
+        for ch in label:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+    return re.compile(_trie_pattern(trie))
@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+from typing import IO, Any, Iterable, Iterator
+
+import cv2
+
+from dedup import PageSignature, find_scroll, is_duplicate
+from metrics import VIDEO_FRAMES
+from preprocess import prepare_image
+from timings import timed
+
+# Screen recordings of a scrolling page are read a few frames per second; a scroll
+# rarely moves more than half a screen in that time
+VIDEO_SAMPLE_FPS = float(os.environ.get("VIDEO_SAMPLE_FPS", 5))
+VIDEO_MAX_SECONDS = float(os.environ.get("VIDEO_MAX_SECONDS", 60))
+# A frame becomes a keyframe once the view scrolled this fraction of its height since
+# the last keyframe, so consecutive keyframes still overlap
+KEYFRAME_SCROLL = 0.6
+
+
+def read_video_frames(video: IO[bytes], sample_fps: float = VIDEO_SAMPLE_FPS) -> Iterator[Any]:
+    """Decodes about `sample_fps` frames per second of a video file, as prepared pages.
+
+    OpenCV reads videos from a path, so the upload is spooled to a temporary
+    file first. Raises ValueError when the file is not a readable video or is
+    longer than `VIDEO_MAX_SECONDS`.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".video", delete=False) as f:
+        shutil.copyfileobj(video, f)
+        path = f.name
+    capture = None
+    try:
+        capture = cv2.VideoCapture(path)
+        if not capture.isOpened():
+            raise ValueError("could not read the video.")
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        frame_count = capture.get(cv2.CAP_PROP_FRAME_COUNT)
+        if frame_count > 0 and frame_count / fps > VIDEO_MAX_SECONDS:
+            raise ValueError(f"video is longer than {VIDEO_MAX_SECONDS:g} seconds.")
+        step = max(1, round(fps / sample_fps))
+        idx = 0
+        # grab() skips frames without converting them
+        while capture.grab():
+            # Streamed containers (WebM, fragmented MP4) often report no frame count
+            if idx / fps > VIDEO_MAX_SECONDS:
+                raise ValueError(f"video is longer than {VIDEO_MAX_SECONDS:g} seconds.")
+            if idx % step == 0:
+                with timed("decode"):
+                    ok, frame = capture.retrieve()
+                    if not ok:
+                        break
+                    frame = prepare_image(frame)
+                VIDEO_FRAMES.labels("sampled").inc()
+                yield frame
+            idx += 1
+        if idx == 0:
+            raise ValueError("could not read the video.")
+    finally:
+        if capture is not None:
+            capture.release()
+        os.remove(path)
+
+
+def keyframes(frames: Iterable[Any], scroll_fraction: float = KEYFRAME_SCROLL) -> Iterator[Any]:
+    """Picks the frames of a scrolling screen recording that show rows no earlier one did.
+
+    Frames that look like the one before are dropped without a scroll search.
+    A frame becomes a keyframe once the view has scrolled `scroll_fraction` of
+    its height down from the last keyframe (see `dedup.find_scroll`). When a
+    frame no longer lines up with the last keyframe (a fast scroll, another
+    screen), the last frame that did is kept first, so no rows are missed; the
+    final position of the recording is always kept. Frames scrolled back up
+    over rows already seen are dropped.
+    """
+    previous = kept = None
+    pending: tuple[Any, PageSignature] | None = None
+    for frame in frames:
+        signature = PageSignature(frame)
+        if previous is not None and is_duplicate(previous, signature):
+            continue  # nothing moved
+        previous = signature
+        if kept is None:
+            kept = signature
+            yield frame
+            continue
+        scroll = find_scroll(kept, signature)
+        if scroll is None and pending is not None:
+            # Lost track of the last keyframe; the furthest frame that still lined up goes first
+            yield pending[0]
+            kept, pending = pending[1], None
+            scroll = find_scroll(kept, signature)
+        if scroll is None and find_scroll(signature, kept) is not None:
+            continue  # scrolled back up
+        if scroll is None or scroll[2] >= (scroll[1] - scroll[0]) * scroll_fraction:
+            kept, pending = signature, None
+            yield frame
+        else:
+            pending = (frame, signature)
+    if pending is not None:
+        yield pending[0]
@@ -0,0 +1,36 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import pytest
+
+from admission import AdmissionController
+
+
+def test_release_skips_waiter_cancelled_before_cleanup():
+    async def scenario():
+        controller = AdmissionController(max_active=1, max_queued=8, wait_budget_s=1000)
+        await controller.acquire("a")
+        cancelled = asyncio.create_task(controller.acquire("b"))
+        waiting = asyncio.create_task(controller.acquire("c"))
+        await asyncio.sleep(0)
+        assert controller.queued == 2
+
+        # Cancelling the task cancels the future it waits on right away; its
+        # `except CancelledError` block only runs on a later loop iteration
+        cancelled.cancel()
+        controller.release(1.0)
+
+        await asyncio.wait_for(waiting, 1)
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        assert controller.active == 1
+        assert controller.queued == 0
+
+        controller.release(1.0)
+        await asyncio.wait_for(controller.acquire("d"), 1)
+        assert controller.active == 1
+
+    asyncio.run(scenario())
@@ -0,0 +1,26 @@
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+import cv2
+
+from dedup import PageDeduper
+
+
+def test_repeated_page_is_skipped_and_new_pages_kept():
+    first, second = (cv2.imread(os.path.join(ROOT, "images", "minime", f"{n}.png")) for n in (1, 2))
+    dedup = PageDeduper("bonus_overview", crop_scrolled=True, enabled=True)
+    pages = list(dedup.filter([first, first.copy(), second]))
+    assert dedup.kept == [0, 2]
+    assert dedup.skipped == [1]
+    assert len(pages) == 2
+    assert pages[0] is first
+
+
+def test_disabled_deduper_keeps_every_page():
+    page = cv2.imread(os.path.join(ROOT, "images", "minime", "1.png"))
+    dedup = PageDeduper("bonus_overview", enabled=False)
+    assert len(list(dedup.filter([page, page]))) == 2
+    assert dedup.skipped == []
@@ -0,0 +1,33 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from jobs import JobStore
+
+
+def test_expired_lease_goes_to_another_worker_and_stale_result_is_dropped(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = store.submit("battle_report", [b"page"], {"stats_only": True})
+    assert store.claim("a", lease_s=0.01)["id"] == job_id
+    time.sleep(0.05)
+
+    # Worker "a" stalled past its lease; "b" retries the job
+    assert store.claim("b")["id"] == job_id
+    assert not store.renew(job_id, "a")
+    assert not store.complete(job_id, "a", {"stale": True})
+    assert store.complete(job_id, "b", {"ok": True})
+    job = store.get(job_id)
+    assert job["status"] == "done"
+    assert job["result"] == {"ok": True}
+
+
+def test_requeued_job_is_claimed_again_without_using_an_attempt(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    job_id = store.submit("bonus_overview", [b"page"], {})
+    store.claim("a")
+    assert store.requeue(job_id, "a")
+    assert store.get(job_id)["status"] == "queued"
+    assert store.claim("b")["id"] == job_id
+    assert store.get(job_id)["attempts"] == 1
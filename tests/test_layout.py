@@ -0,0 +1,27 @@
+import os
+import pickle
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import pytest
+
+from battle_report import PAGE_LAYOUTS
+from bonus_overview import BONUS_OVERVIEW_LAYOUT
+from layout import LayoutTemplate
+
+SHIPPED_LAYOUTS = [BONUS_OVERVIEW_LAYOUT, *PAGE_LAYOUTS.values()]
+
+
+@pytest.mark.parametrize("layout", SHIPPED_LAYOUTS, ids=lambda layout: layout.name)
+def test_shipped_layouts_pickle_for_process_pool_workers(layout):
+    restored = pickle.loads(pickle.dumps(layout))
+    assert restored.name == layout.name
+    assert restored.labels == layout.labels
+    assert restored.is_value("12.5%") == layout.is_value("12.5%")
+
+
+def test_default_value_check_pickles():
+    layout = pickle.loads(pickle.dumps(LayoutTemplate("t", ("label", "value"), ["a"])))
+    assert layout.is_value("x1")
+    assert not layout.is_value("abc")
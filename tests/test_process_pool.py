@@ -0,0 +1,61 @@
+import base64
+import glob
+import json
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+import pytest
+
+import battle_report
+import ocr
+from battle_report import parse_battle_report
+from bonus_overview import parse_bonus_overview
+from ocr_cache import ocr_cache
+from ocr_pool import OCRPool
+from schemas.outputs import BattleOutcome, BattleReportOutput, BonusOverviewOutput, Stats
+
+
+def load_b64(pattern: str) -> list[str]:
+    images = []
+    for path in sorted(glob.glob(os.path.join(ROOT, pattern))):
+        with open(path, "rb") as f:
+            images.append(base64.b64encode(f.read()).decode())
+    return images
+
+
+def golden(name: str) -> dict:
+    with open(os.path.join(ROOT, "benchmarks", "golden", f"{name}.json")) as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope="module")
+def process_pool():
+    # Everything the parsers hand to the pool (layouts included) must survive pickling
+    pool = OCRPool(size=2, backend="process", initializer=ocr._init_pool_worker)
+    patch = pytest.MonkeyPatch()
+    patch.setattr(ocr, "ocr_pool", pool)
+    patch.setattr(battle_report, "ocr_pool", pool)
+    # Cached results would be served without reaching the workers
+    patch.setattr(ocr_cache, "max_bytes", 0)
+    patch.setattr(ocr_cache, "directory", None)
+    yield pool
+    patch.undo()
+    pool.shutdown()
+
+
+def test_bonus_overview_on_process_pool(process_pool):
+    stats = parse_bonus_overview(load_b64("images/minime/*.png"))
+    assert BonusOverviewOutput.from_stats_dict(stats).model_dump() == golden("bonus_overview")
+
+
+def test_battle_report_on_process_pool(process_pool):
+    stats, outcome = parse_battle_report(load_b64("images/test_battle_report/*.png"), stats_only=False)
+    output = BattleReportOutput(
+        left_stats=Stats.from_dict(stats["left"]),
+        right_stats=Stats.from_dict(stats["right"]),
+        troops_outcome=BattleOutcome.from_dict(outcome),
+    )
+    assert output.model_dump() == golden("battle_report")
@@ -0,0 +1,23 @@
+import os
+import sys
+from contextvars import copy_context
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from timings import StageTimings, iter_collecting, record
+
+
+def test_iter_collecting_records_steps_resumed_in_other_contexts():
+    def steps():
+        record("decode", 1.0)
+        yield "page"
+        record("parse", 2.0)
+        yield "done"
+
+    timings = StageTimings()
+    items = iter_collecting(steps(), timings)
+    # Like a streamed body stepped on threadpool threads, each step runs in a fresh context
+    assert copy_context().run(next, items) == "page"
+    assert copy_context().run(next, items) == "done"
+    assert list(items) == []
+    assert timings.as_dict() == {"decode": 1.0, "parse": 2.0}